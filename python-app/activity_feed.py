@@ -0,0 +1,146 @@
+"""
+Shared activity change feed.
+
+One background poller per process lists activities, diffs the result
+against the previous snapshot by row id and pushes only the inserted,
+updated and deleted rows to every subscriber. Remote load is one list
+call per interval no matter how many dashboards are open, and changes
+made elsewhere (e.g. by agents) show up without a manual refresh.
+
+Local mutations call `refresh_now()`, which wakes the poller early;
+concurrent requests are coalesced into a single list call.
+
+Configuration (environment):
+    RTX_ACTIVITY_POLL_INTERVAL   seconds between polls (default: 5)
+    RTX_ACTIVITY_FEED_LIMIT      rows tracked (default: 20)
+"""
+import asyncio
+import json
+import os
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable
+
+import services
+
+@dataclass
+class ActivityDiff:
+    inserted: List[Dict[str, Any]] = field(default_factory=list)
+    updated: List[Dict[str, Any]] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.inserted or self.updated or self.deleted)
+
+    def apply(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return `rows` with this diff applied, newest first like the API listing."""
+        deleted = set(self.deleted)
+        updated = {r['id']: r for r in self.updated}
+        kept = [updated.get(r['id'], r) for r in rows if r['id'] not in deleted]
+        return sorted(self.inserted + kept, key=lambda r: r.get('created_at', ''), reverse=True)
+
+def _fingerprint(row: Dict[str, Any]) -> str:
+    return json.dumps(row, sort_keys=True, default=str)
+
+def diff_rows(old: Dict[str, str], rows: List[Dict[str, Any]]) -> ActivityDiff:
+    """Compare a new listing against fingerprints of the previous one."""
+    diff = ActivityDiff()
+    seen = set()
+    for row in rows:
+        seen.add(row['id'])
+        if row['id'] not in old:
+            diff.inserted.append(row)
+        elif old[row['id']] != _fingerprint(row):
+            diff.updated.append(row)
+    diff.deleted = [row_id for row_id in old if row_id not in seen]
+    return diff
+
+class ActivityFeed:
+    def __init__(self, interval: float = 5.0, limit: int = 20):
+        self.interval = interval
+        self.limit = limit
+        self.rows: List[Dict[str, Any]] = []
+        self.loaded = False
+        self.polls = 0
+        self._fingerprints: Dict[str, str] = {}
+        self._subscribers: List[Callable[[ActivityDiff], None]] = []
+        self._waiters: List[asyncio.Future] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Callable[[ActivityDiff], None]) -> Callable[[], None]:
+        """Register a diff callback; returns a function that unsubscribes it."""
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+        return unsubscribe
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def refresh_now(self) -> List[Dict[str, Any]]:
+        """Poll as soon as possible and wait for the result."""
+        self.start()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._wake.set()
+        return await waiter
+
+    async def _run(self):
+        while True:
+            # Idle processes (no dashboards, nobody waiting) make no remote calls
+            if self._subscribers or self._waiters:
+                await self._poll()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _poll(self):
+        waiters, self._waiters = self._waiters, []
+        try:
+            rows = await services.list_activities(limit=self.limit)
+        except Exception as e:
+            for w in waiters:
+                if not w.done():
+                    w.set_exception(e)
+            return
+        self.polls += 1
+        diff = diff_rows(self._fingerprints, rows)
+        self.rows = rows
+        self._fingerprints = {r['id']: _fingerprint(r) for r in rows}
+        self.loaded = True
+        if diff:
+            for callback in list(self._subscribers):
+                try:
+                    callback(diff)
+                except Exception:
+                    # A dead client must not stop the feed for everyone else
+                    pass
+        for w in waiters:
+            if not w.done():
+                w.set_result(rows)
+
+_feed: Optional[ActivityFeed] = None
+
+def get_feed() -> ActivityFeed:
+    global _feed
+    if _feed is None:
+        _feed = ActivityFeed(
+            interval=float(os.environ.get('RTX_ACTIVITY_POLL_INTERVAL', 5)),
+            limit=int(os.environ.get('RTX_ACTIVITY_FEED_LIMIT', 20))
+        )
+    return _feed
@@ -0,0 +1,315 @@
+"""
+Opt-in response cache for deterministic chat requests.
+
+Entries are keyed by a SHA-256 of the normalized messages, provider/model
+and response_format, and persisted in SQLite with a TTL and a maximum
+entry count (least recently used entries are evicted first).
+
+An optional semantic tier stores an embedding of each prompt and reuses
+the answer of the most similar cached prompt (same provider/model and
+response_format) when cosine similarity is above a threshold. Stored
+embeddings (float32 blobs) are loaded once into an in-memory, normalized
+numpy matrix per scope, so a lookup is one matrix-vector product. numpy
+is only imported once the semantic tier is used.
+
+Configuration (environment):
+    RTX_CHAT_CACHE=1                       enable by default
+    RTX_CHAT_CACHE_PATH                    SQLite file (default: storage/chat_cache.sqlite3)
+    RTX_CHAT_CACHE_TTL                     seconds (default: 86400)
+    RTX_CHAT_CACHE_MAX_ENTRIES             default: 1000
+    RTX_CHAT_CACHE_SEMANTIC=1              enable the semantic tier
+    RTX_CHAT_CACHE_SEMANTIC_THRESHOLD      cosine similarity (default: 0.95)
+    RTX_CHAT_CACHE_EMBED_MODEL             provider/model used for prompt embeddings
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Iterator, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'chat_cache.sqlite3')
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, '').lower() in ('1', 'true', 'yes', 'on')
+
+@dataclass
+class CacheConfig:
+    enabled: bool = False
+    path: str = DEFAULT_PATH
+    ttl: float = 86400.0
+    max_entries: int = 1000
+    semantic: bool = False
+    semantic_threshold: float = 0.95
+    embed_model: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> 'CacheConfig':
+        return cls(
+            enabled=_env_flag('RTX_CHAT_CACHE'),
+            path=os.environ.get('RTX_CHAT_CACHE_PATH', DEFAULT_PATH),
+            ttl=float(os.environ.get('RTX_CHAT_CACHE_TTL', 86400)),
+            max_entries=int(os.environ.get('RTX_CHAT_CACHE_MAX_ENTRIES', 1000)),
+            semantic=_env_flag('RTX_CHAT_CACHE_SEMANTIC'),
+            semantic_threshold=float(os.environ.get('RTX_CHAT_CACHE_SEMANTIC_THRESHOLD', 0.95)),
+            embed_model=os.environ.get('RTX_CHAT_CACHE_EMBED_MODEL') or None,
+        )
+
+@dataclass
+class CacheHit:
+    content: str
+    kind: str  # 'exact' or 'semantic'
+    similarity: float = 1.0
+
+# --- Normalization ---
+
+def _normalize_content(content: Any) -> Any:
+    if isinstance(content, str):
+        # Inner whitespace is meaningful (code indentation, line breaks)
+        return content.strip()
+    # Multimodal content blocks: keep structure, order keys
+    return json.loads(json.dumps(content, sort_keys=True))
+
+def normalize_messages(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{'role': m.get('role', 'user'), 'content': _normalize_content(m.get('content', ''))} for m in messages]
+
+def scope_key(provider: Optional[str], model: Optional[str], response_format: Optional[Dict[str, Any]]) -> str:
+    """Requests only share answers within the same provider/model/response_format."""
+    return json.dumps([provider, model, response_format], sort_keys=True)
+
+def cache_key(
+    messages: List[Dict[str, Any]],
+    provider: Optional[str],
+    model: Optional[str],
+    response_format: Optional[Dict[str, Any]]
+) -> str:
+    payload = json.dumps({
+        'messages': normalize_messages(messages),
+        'scope': scope_key(provider, model, response_format),
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    """Flattened conversation used as the semantic-tier embedding input."""
+    lines = []
+    for m in normalize_messages(messages):
+        content = m['content'] if isinstance(m['content'], str) else json.dumps(m['content'])
+        lines.append(f"{m['role']}: {content}")
+    return "\n".join(lines)
+
+def _unit(vector: List[float]) -> Optional['np.ndarray']:
+    import numpy as np
+    v = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(v))
+    return v / norm if norm else None
+
+def _encode_embedding(vector: List[float]) -> bytes:
+    import numpy as np
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def _decode_embedding(raw: bytes) -> 'np.ndarray':
+    import numpy as np
+    return np.frombuffer(raw, dtype=np.float32)
+
+def replay_chunks(content: str, size: int = 24) -> Iterator[str]:
+    """Split a cached answer into stream-sized pieces on word boundaries."""
+    piece = ''
+    for word in re.split(r'(\s+)', content):
+        piece += word
+        if len(piece) >= size:
+            yield piece
+            piece = ''
+    if piece:
+        yield piece
+
+# --- Store ---
+
+class _ScopeIndex:
+    """Unit-length prompt embeddings of one scope, grouped by dimension
+    (switching the embed model changes it)."""
+
+    def __init__(self):
+        self.groups: Dict[int, Tuple[List[str], List[float], 'np.ndarray']] = {}
+
+    def __len__(self) -> int:
+        return sum(len(keys) for keys, _, _ in self.groups.values())
+
+    @classmethod
+    def build(cls, rows: List[Tuple[str, float, 'np.ndarray']]) -> '_ScopeIndex':
+        import numpy as np
+        index = cls()
+        by_dim: Dict[int, List[Tuple[str, float, 'np.ndarray']]] = {}
+        for row in rows:
+            by_dim.setdefault(len(row[2]), []).append(row)
+        for dim, group in by_dim.items():
+            index.groups[dim] = ([r[0] for r in group], [r[1] for r in group], np.stack([r[2] for r in group]))
+        return index
+
+    def add(self, key: str, created_at: float, vector: 'np.ndarray'):
+        import numpy as np
+        keys, created, matrix = self.groups.get(len(vector), ([], [], np.empty((0, len(vector)), np.float32)))
+        self.groups[len(vector)] = (keys + [key], created + [created_at], np.vstack([matrix, vector]))
+
+    def remove(self, doomed: set):
+        for dim, (keys, created, matrix) in list(self.groups.items()):
+            keep = [i for i, key in enumerate(keys) if key not in doomed]
+            if len(keep) < len(keys):
+                self.groups[dim] = ([keys[i] for i in keep], [created[i] for i in keep], matrix[keep])
+
+    def best(self, query: 'np.ndarray', oldest: float) -> Tuple[Optional[str], float]:
+        import numpy as np
+        if len(query) not in self.groups:
+            return None, -1.0
+        keys, created, matrix = self.groups[len(query)]
+        if not keys:
+            return None, -1.0
+        sims = matrix @ query
+        sims[np.asarray(created) <= oldest] = -1.0
+        i = int(np.argmax(sims))
+        return keys[i], float(sims[i])
+
+class ChatCache:
+    def __init__(self, config: CacheConfig):
+        self.config = config
+        self.hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._index: Dict[str, _ScopeIndex] = {}
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.config.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.config.path, check_same_thread=False)
+            self._db.execute('''
+                CREATE TABLE IF NOT EXISTS chat_cache (
+                    key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    embedding BLOB,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            ''')
+            self._db.execute('CREATE INDEX IF NOT EXISTS chat_cache_scope ON chat_cache (scope)')
+            self._db.commit()
+        return self._db
+
+    def _scope_index(self, scope: str) -> _ScopeIndex:
+        """Load a scope's embeddings on first use; kept in sync by put/evict/clear."""
+        if scope not in self._index:
+            rows = []
+            for key, raw, created_at in self.db.execute(
+                'SELECT key, embedding, created_at FROM chat_cache WHERE scope = ? AND embedding IS NOT NULL',
+                (scope,)
+            ):
+                vector = _unit(_decode_embedding(raw))
+                if vector is not None:
+                    rows.append((key, created_at, vector))
+            self._index[scope] = _ScopeIndex.build(rows)
+        return self._index[scope]
+
+    def has_embeddings(self, scope: str) -> bool:
+        """Whether a semantic lookup in `scope` could hit at all."""
+        return len(self._scope_index(scope)) > 0
+
+    def get(self, key: str) -> Optional[CacheHit]:
+        now = time.time()
+        row = self.db.execute(
+            'SELECT content FROM chat_cache WHERE key = ? AND created_at > ?',
+            (key, now - self.config.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        self._touch(key, now)
+        return CacheHit(content=row[0], kind='exact')
+
+    def get_similar(self, scope: str, embedding: List[float]) -> Optional[CacheHit]:
+        now = time.time()
+        query = _unit(embedding)
+        if query is None:
+            return None
+        best_key, best_sim = self._scope_index(scope).best(query, now - self.config.ttl)
+        if best_key is None or best_sim < self.config.semantic_threshold:
+            return None
+        row = self.db.execute(
+            'SELECT content FROM chat_cache WHERE key = ? AND created_at > ?',
+            (best_key, now - self.config.ttl)
+        ).fetchone()
+        if row is None:
+            # Evicted or replaced behind the index's back: rebuild on next lookup
+            self._index.pop(scope, None)
+            return None
+        self._touch(best_key, now)
+        return CacheHit(content=row[0], kind='semantic', similarity=best_sim)
+
+    def add_embedding(self, key: str, scope: str, embedding: List[float]):
+        """Attach a prompt embedding to an entry stored without one."""
+        cur = self.db.execute(
+            'UPDATE chat_cache SET embedding = ? WHERE key = ? AND embedding IS NULL',
+            (_encode_embedding(embedding), key)
+        )
+        self.db.commit()
+        vector = _unit(embedding)
+        if cur.rowcount and vector is not None and scope in self._index:
+            created_at = self.db.execute('SELECT created_at FROM chat_cache WHERE key = ?', (key,)).fetchone()[0]
+            self._index[scope].add(key, created_at, vector)
+
+    def put(self, key: str, scope: str, content: str, embedding: Optional[List[float]] = None):
+        now = time.time()
+        replaced = self.db.execute('SELECT 1 FROM chat_cache WHERE key = ?', (key,)).fetchone()
+        self.db.execute(
+            'INSERT OR REPLACE INTO chat_cache (key, scope, content, embedding, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, scope, content, _encode_embedding(embedding) if embedding else None, now, now)
+        )
+        self._evict(now)
+        self.db.commit()
+        if replaced:
+            self._index.pop(scope, None)
+        elif embedding and scope in self._index:
+            vector = _unit(embedding)
+            if vector is not None:
+                self._index[scope].add(key, now, vector)
+
+    def clear(self):
+        self.db.execute('DELETE FROM chat_cache')
+        self.db.commit()
+        self._index.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self.db.execute('SELECT COUNT(*) FROM chat_cache').fetchone()[0]
+        return {'entries': entries, 'hits': self.hits, 'misses': self.misses}
+
+    def _touch(self, key: str, now: float):
+        self.db.execute('UPDATE chat_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        self.db.commit()
+
+    def _evict(self, now: float):
+        doomed = self.db.execute('SELECT key, scope FROM chat_cache WHERE created_at <= ?', (now - self.config.ttl,)).fetchall()
+        doomed += self.db.execute(
+            'SELECT key, scope FROM chat_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?',
+            (self.config.max_entries,)
+        ).fetchall()
+        if not doomed:
+            return
+        self.db.executemany('DELETE FROM chat_cache WHERE key = ?', [(key,) for key, _ in doomed])
+        by_scope: Dict[str, set] = {}
+        for key, scope in doomed:
+            by_scope.setdefault(scope, set()).add(key)
+        for scope, keys in by_scope.items():
+            if scope in self._index:
+                self._index[scope].remove(keys)
+
+_cache: Optional[ChatCache] = None
+
+def get_cache() -> ChatCache:
+    """Return the process-wide cache, configured from the environment on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ChatCache(CacheConfig.from_env())
+    return _cache
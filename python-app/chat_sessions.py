@@ -0,0 +1,269 @@
+"""
+Persistent chat sessions with token-budgeted context pruning.
+
+History is stored incrementally in SQLite (one row per message). Before
+each call the context is fitted into a token budget: system messages and
+the newest turns are kept, older turns are dropped and, with the
+'summarize' strategy, replaced by a running summary that is refreshed in
+the background after the reply so it never adds latency to a turn.
+
+Configuration (environment):
+    RTX_CHAT_SESSIONS_PATH      SQLite file (default: storage/chat_sessions.sqlite3)
+    RTX_CHAT_TOKEN_BUDGET       prompt token budget per call (default: 3000)
+    RTX_CHAT_PRUNE_STRATEGY     'summarize' or 'drop' (default: summarize)
+"""
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'chat_sessions.sqlite3')
+DEFAULT_BUDGET = int(os.environ.get('RTX_CHAT_TOKEN_BUDGET', 3000))
+DEFAULT_STRATEGY = os.environ.get('RTX_CHAT_PRUNE_STRATEGY', 'summarize')
+
+# Per-message framing overhead (role, separators) used by most chat templates
+MESSAGE_OVERHEAD = 4
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few sentences. Keep names, facts, "
+    "decisions and open questions; drop pleasantries."
+)
+
+def estimate_tokens(content: Any) -> int:
+    """Rough token count (~4 characters per token); no tokenizer dependency."""
+    if not isinstance(content, str):
+        content = json.dumps(content)
+    return MESSAGE_OVERHEAD + (len(content) + 3) // 4
+
+def count_tokens(messages: List[Dict[str, Any]]) -> int:
+    return sum(estimate_tokens(m.get('content', '')) for m in messages)
+
+@dataclass
+class ChatSession:
+    id: str
+    title: str
+    messages: List[Dict[str, Any]] = field(default_factory=list)
+    summary: str = ""
+    # Number of leading non-system messages covered by `summary`
+    summarized_upto: int = 0
+
+@dataclass
+class PrunedContext:
+    messages: List[Dict[str, Any]]
+    full_tokens: int
+    sent_tokens: int
+    dropped: int
+    # Non-system messages that fell out of the window (oldest first)
+    dropped_messages: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def saved_tokens(self) -> int:
+        return self.full_tokens - self.sent_tokens
+
+def _is_system(m: Dict[str, Any]) -> bool:
+    return m.get('role') == 'system'
+
+def merge_messages(history: List[Dict[str, Any]], new_messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """`history` with `new_messages` appended.
+
+    System messages in `new_messages` replace the history's system
+    messages instead of piling up, so a client that re-sends its system
+    prompt every turn does not grow the context.
+    """
+    new_system = [m for m in new_messages if _is_system(m)]
+    rest = [m for m in new_messages if not _is_system(m)]
+    if not new_system:
+        return history + rest
+    return new_system + [m for m in history if not _is_system(m)] + rest
+
+def _group_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split non-system messages into turns, each starting at a user message.
+
+    Messages before the first user message form a turn of their own.
+    """
+    turns: List[List[Dict[str, Any]]] = []
+    for m in messages:
+        if m.get('role') == 'user' or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return turns
+
+def _newest_within(turns: List[List[Dict[str, Any]]], remaining: int) -> List[Dict[str, Any]]:
+    """The newest whole turns that fit in `remaining` tokens, flattened.
+
+    The newest turn is kept even if it alone is over budget. Pruned
+    context always starts with a user message, as chat templates that
+    require user/assistant alternation expect.
+    """
+    kept: List[List[Dict[str, Any]]] = []
+    for turn in reversed(turns):
+        cost = count_tokens(turn)
+        if kept and cost > remaining:
+            break
+        kept.insert(0, turn)
+        remaining -= cost
+    if len(kept) > 1 and kept[0][0].get('role') != 'user':
+        kept.pop(0)
+    return [m for turn in kept for m in turn]
+
+def fit_to_budget(session: ChatSession, budget: int, strategy: str = DEFAULT_STRATEGY) -> PrunedContext:
+    """Select the context for the next call.
+
+    System messages are always kept. The newest turns (a user message and
+    the replies to it) are added whole until the budget is spent; the most
+    recent turn is kept even if it alone is over budget. With 'summarize', the running summary stands in for the
+    dropped turns it covers; its tokens are only reserved when turns
+    actually have to be dropped.
+    """
+    system = [m for m in session.messages if _is_system(m)]
+    turns = [m for m in session.messages if not _is_system(m)]
+    full_tokens = count_tokens(session.messages)
+
+    grouped = _group_turns(turns)
+    remaining = budget - count_tokens(system)
+    kept = _newest_within(grouped, remaining)
+    summary_msg = None
+    if len(kept) < len(turns) and strategy == 'summarize' and session.summary:
+        summary_msg = {'role': 'system', 'content': f"Summary of earlier conversation: {session.summary}"}
+        kept = _newest_within(grouped, remaining - count_tokens([summary_msg]))
+
+    dropped_messages = turns[:len(turns) - len(kept)]
+    context = system + ([summary_msg] if summary_msg else []) + kept
+    return PrunedContext(
+        messages=context,
+        full_tokens=full_tokens,
+        sent_tokens=count_tokens(context),
+        dropped=len(dropped_messages),
+        dropped_messages=dropped_messages
+    )
+
+def summary_request(session: ChatSession, dropped_messages: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """Messages for refreshing the running summary, or None if it is current."""
+    pending = dropped_messages[session.summarized_upto:]
+    if not pending:
+        return None
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in pending)
+    if session.summary:
+        transcript = f"Previous summary: {session.summary}\n\n{transcript}"
+    return [
+        {'role': 'system', 'content': SUMMARY_PROMPT},
+        {'role': 'user', 'content': transcript},
+    ]
+
+# --- Store ---
+
+class SessionStore:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._sessions: Dict[str, ChatSession] = {}
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript('''
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    summary TEXT NOT NULL DEFAULT '',
+                    summarized_upto INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS session_messages (
+                    session_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (session_id, seq)
+                );
+            ''')
+        return self._db
+
+    def create(self, title: str = "New chat") -> ChatSession:
+        session = ChatSession(id=uuid.uuid4().hex[:12], title=title)
+        self.db.execute(
+            'INSERT INTO sessions (id, title, updated_at) VALUES (?, ?, ?)',
+            (session.id, title, time.time())
+        )
+        self.db.commit()
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Optional[ChatSession]:
+        if session_id in self._sessions:
+            return self._sessions[session_id]
+        row = self.db.execute(
+            'SELECT title, summary, summarized_upto FROM sessions WHERE id = ?', (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        messages = [
+            {'role': role, 'content': json.loads(content)}
+            for role, content in self.db.execute(
+                'SELECT role, content FROM session_messages WHERE session_id = ? ORDER BY seq', (session_id,)
+            )
+        ]
+        session = ChatSession(id=session_id, title=row[0], messages=messages, summary=row[1], summarized_upto=row[2])
+        self._sessions[session_id] = session
+        return session
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [
+            {'id': r[0], 'title': r[1], 'updated_at': r[2]}
+            for r in self.db.execute('SELECT id, title, updated_at FROM sessions ORDER BY updated_at DESC')
+        ]
+
+    def append(self, session: ChatSession, messages: List[Dict[str, Any]]):
+        """Persist only the new messages.
+
+        A system prompt identical to the session's is not stored again; a
+        different one replaces it, which rewrites the stored history.
+        """
+        messages = [{'role': m.get('role', 'user'), 'content': m.get('content', '')} for m in messages]
+        new_system = [m for m in messages if _is_system(m)]
+        if new_system and new_system != [m for m in session.messages if _is_system(m)]:
+            merged = merge_messages(session.messages, messages)
+            self.db.execute('DELETE FROM session_messages WHERE session_id = ?', (session.id,))
+            start, rows, session.messages = 0, merged, []
+        else:
+            start, rows = len(session.messages), [m for m in messages if not _is_system(m)]
+        self.db.executemany(
+            'INSERT INTO session_messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)',
+            [(session.id, start + i, m['role'], json.dumps(m['content'])) for i, m in enumerate(rows)]
+        )
+        session.messages.extend(rows)
+        if session.title == "New chat":
+            first_user = next((m for m in session.messages if m['role'] == 'user' and isinstance(m['content'], str)), None)
+            if first_user:
+                session.title = first_user['content'][:40]
+        self.db.execute(
+            'UPDATE sessions SET title = ?, updated_at = ? WHERE id = ?', (session.title, time.time(), session.id)
+        )
+        self.db.commit()
+
+    def set_summary(self, session: ChatSession, summary: str, summarized_upto: int):
+        session.summary = summary
+        session.summarized_upto = summarized_upto
+        self.db.execute(
+            'UPDATE sessions SET summary = ?, summarized_upto = ? WHERE id = ?', (summary, summarized_upto, session.id)
+        )
+        self.db.commit()
+
+    def delete(self, session_id: str):
+        self._sessions.pop(session_id, None)
+        self.db.execute('DELETE FROM session_messages WHERE session_id = ?', (session_id,))
+        self.db.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+        self.db.commit()
+
+_store: Optional[SessionStore] = None
+
+def get_store() -> SessionStore:
+    global _store
+    if _store is None:
+        _store = SessionStore(os.environ.get('RTX_CHAT_SESSIONS_PATH', DEFAULT_PATH))
+    return _store
@@ -0,0 +1,169 @@
+"""
+Adaptive batch-size / concurrency autotuner for embeddings.
+
+Throughput of `llm.embed` depends heavily on the provider and model: a
+local model may peak at small batches with no parallelism while a cloud
+API wants large batches and several requests in flight. `autotune`
+probes a grid of (batch size, concurrency) pairs with sample texts,
+measures chunks/second and keeps the fastest setting that finished
+without errors or timeouts. Results are saved per provider/model and
+picked up by later ingestion and multi-query search workloads.
+
+Configuration (environment):
+    RTX_EMBED_TUNING_PATH   JSON file (default: storage/embed_tuning.json)
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Iterator, Sequence
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'embed_tuning.json')
+BATCH_SIZES = (1, 4, 8, 16, 32, 64)
+CONCURRENCIES = (1, 2, 4, 8)
+PROBE_TIMEOUT = 30.0
+# Stop growing the batch once throughput falls this far below the best seen
+FALLOFF = 0.8
+
+SAMPLE_TEXT = (
+    "RealtimeX Local Apps extend the desktop hub with custom tools. Each app "
+    "talks to the hub through the SDK for activities, agents, language models, "
+    "vector search and speech. This paragraph is a representative chunk used "
+    "to measure embedding throughput for the selected provider and model."
+)
+
+@dataclass
+class TunedSettings:
+    batch_size: int
+    concurrency: int
+    chunks_per_sec: float = 0.0
+    tuned_at: float = 0.0
+
+# Used when a provider/model has not been tuned yet
+DEFAULT_SETTINGS = TunedSettings(batch_size=16, concurrency=2)
+
+@dataclass
+class Probe:
+    batch_size: int
+    concurrency: int
+    chunks_per_sec: float = 0.0
+    error: Optional[str] = None
+
+def batches(items: Sequence[Any], size: int) -> Iterator[Sequence[Any]]:
+    for i in range(0, len(items), max(1, size)):
+        yield items[i:i + size]
+
+def model_key(provider: Optional[str], model: Optional[str]) -> str:
+    return f"{provider or 'default'}/{model or 'default'}"
+
+class TuningStore:
+    def __init__(self, path: str = DEFAULT_PATH):
+        self.path = path
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+
+    @property
+    def data(self) -> Dict[str, Dict[str, Any]]:
+        if self._data is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}
+        return self._data
+
+    def get(self, provider: Optional[str], model: Optional[str]) -> Optional[TunedSettings]:
+        entry = self.data.get(model_key(provider, model))
+        return TunedSettings(**entry) if entry else None
+
+    def settings_for(self, provider: Optional[str], model: Optional[str]) -> TunedSettings:
+        return self.get(provider, model) or DEFAULT_SETTINGS
+
+    def save(self, provider: Optional[str], model: Optional[str], settings: TunedSettings):
+        self.data[model_key(provider, model)] = asdict(settings)
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp, self.path)
+
+_store: Optional[TuningStore] = None
+
+def get_store() -> TuningStore:
+    global _store
+    if _store is None:
+        _store = TuningStore(os.environ.get('RTX_EMBED_TUNING_PATH', DEFAULT_PATH))
+    return _store
+
+async def _probe(
+    embed: Callable[[List[str]], Awaitable[Any]],
+    texts: List[str],
+    batch_size: int,
+    concurrency: int,
+    timeout: float
+) -> Probe:
+    probe = Probe(batch_size, concurrency)
+    batch = [texts[i % len(texts)] for i in range(batch_size)]
+    started = time.perf_counter()
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(*(embed(batch) for _ in range(concurrency))), timeout=timeout
+        )
+        for res in results:
+            if len(res.get('embeddings') or []) != batch_size:
+                raise ValueError(res.get('error') or "incomplete embeddings")
+    except asyncio.TimeoutError:
+        probe.error = f"timeout after {timeout:.0f}s"
+        return probe
+    except Exception as e:
+        probe.error = str(e)
+        return probe
+    probe.chunks_per_sec = batch_size * concurrency / (time.perf_counter() - started)
+    return probe
+
+async def autotune(
+    embed: Callable[[List[str]], Awaitable[Any]],
+    sample_texts: Optional[List[str]] = None,
+    batch_sizes: Sequence[int] = BATCH_SIZES,
+    concurrencies: Sequence[int] = CONCURRENCIES,
+    timeout: float = PROBE_TIMEOUT,
+    on_probe: Optional[Callable[[Probe], None]] = None
+) -> Optional[TunedSettings]:
+    """Find the fastest error-free (batch size, concurrency) for `embed`.
+
+    For each concurrency, batch size grows until a probe fails, times out
+    or falls clearly below the best throughput so far. Returns None if
+    every probe failed.
+    """
+    texts = [t for t in (sample_texts or []) if t.strip()] or [SAMPLE_TEXT]
+    # Warm-up so a cold model load is not charged to the first probe
+    await _probe(embed, texts, 1, 1, timeout)
+
+    best: Optional[Probe] = None
+    for concurrency in concurrencies:
+        level_best = 0.0
+        for batch_size in batch_sizes:
+            probe = await _probe(embed, texts, batch_size, concurrency, timeout)
+            if on_probe:
+                on_probe(probe)
+            if probe.error:
+                break
+            if best is None or probe.chunks_per_sec > best.chunks_per_sec:
+                best = probe
+            if probe.chunks_per_sec < level_best * FALLOFF:
+                break
+            level_best = max(level_best, probe.chunks_per_sec)
+        else:
+            continue
+        # Even the smallest batch failed at this concurrency: more won't help
+        if level_best == 0.0:
+            break
+
+    if best is None:
+        return None
+    return TunedSettings(
+        batch_size=best.batch_size,
+        concurrency=best.concurrency,
+        chunks_per_sec=round(best.chunks_per_sec, 2),
+        tuned_at=time.time()
+    )
@@ -0,0 +1,245 @@
+"""
+Per-capability concurrency limits and shared HTTP transport for SDK calls.
+
+Every SDK call in `services` runs inside `slot(capability)`. Each
+capability has its own semaphore, so a burst of embedding requests cannot
+starve chat, and local model providers see a bounded number of
+concurrent requests. Callers beyond the limit queue; if a slot does not
+free up within the queue timeout a `CapacityError` is raised. Queue wait
+and service time are recorded separately per capability.
+
+Streaming calls go through `stream()`. A task drains the SDK stream into
+a queue while holding the slot, so the slot is released as soon as the
+SDK is done, and service time excludes whatever the caller does between
+chunks (browser round trips, encoding). A slow consumer cannot hold a
+slot.
+
+The SDK opens a new `httpx.AsyncClient` (and TCP connection) per call.
+With `RTX_HTTP_POOL=1`, `install_http_pool()` points the SDK modules at
+one shared, keep-alive client with bounded connections (HTTP/2 when the
+hub URL is https and the `h2` package is installed).
+
+Configuration (environment):
+    RTX_LIMIT_LLM_CHAT, RTX_LIMIT_LLM_EMBED, RTX_LIMIT_VECTORS,
+    RTX_LIMIT_TTS, RTX_LIMIT_STT, RTX_LIMIT_ACTIVITIES, RTX_LIMIT_API
+                                 max concurrent calls per capability
+    RTX_QUEUE_TIMEOUT            seconds to wait for a slot (default: 30)
+    RTX_HTTP_POOL=1              share one pooled HTTP client
+    RTX_HTTP_MAX_CONNECTIONS     default: 20
+    RTX_HTTP_MAX_KEEPALIVE       default: 10
+    RTX_HTTP_KEEPALIVE_EXPIRY    seconds (default: 30)
+"""
+import asyncio
+import os
+import time
+import types
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, Callable, AsyncIterator
+
+DEFAULT_LIMITS = {
+    'llm.chat': 4,
+    'llm.embed': 8,
+    'vectors': 8,
+    'tts': 2,
+    'stt': 1,
+    'activities': 8,
+    'api': 8,
+}
+
+class CapacityError(TimeoutError):
+    """No slot became available for a capability within the queue timeout."""
+    def __init__(self, capability: str, waited: float):
+        self.capability = capability
+        self.waited = waited
+        super().__init__(f"{capability} is at capacity (waited {waited:.1f}s)")
+
+@dataclass
+class CapabilityStats:
+    limit: int
+    in_flight: int = 0
+    queued: int = 0
+    calls: int = 0
+    rejected: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    service_total: float = 0.0
+    service_max: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        n = self.calls or 1
+        return {
+            'limit': self.limit,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'calls': self.calls,
+            'rejected': self.rejected,
+            'wait_avg_ms': round(self.wait_total / n * 1000, 1),
+            'wait_max_ms': round(self.wait_max * 1000, 1),
+            'service_avg_ms': round(self.service_total / n * 1000, 1),
+            'service_max_ms': round(self.service_max * 1000, 1),
+        }
+
+class Limiter:
+    def __init__(self, limits: Dict[str, int], queue_timeout: float = 30.0):
+        self.queue_timeout = queue_timeout
+        self.stats = {name: CapabilityStats(limit=n) for name, n in limits.items()}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, capability: str) -> asyncio.Semaphore:
+        # Created lazily so they bind to the running loop
+        if capability not in self._semaphores:
+            if capability not in self.stats:
+                self.stats[capability] = CapabilityStats(limit=DEFAULT_LIMITS['api'])
+            self._semaphores[capability] = asyncio.Semaphore(self.stats[capability].limit)
+        return self._semaphores[capability]
+
+    @asynccontextmanager
+    async def slot(self, capability: str):
+        sem = self._semaphore(capability)
+        stats = self.stats[capability]
+        queued_at = time.perf_counter()
+        stats.queued += 1
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            stats.rejected += 1
+            raise CapacityError(capability, time.perf_counter() - queued_at)
+        finally:
+            stats.queued -= 1
+
+        started = time.perf_counter()
+        waited = started - queued_at
+        stats.in_flight += 1
+        try:
+            yield
+        finally:
+            service = time.perf_counter() - started
+            stats.in_flight -= 1
+            stats.calls += 1
+            stats.wait_total += waited
+            stats.wait_max = max(stats.wait_max, waited)
+            stats.service_total += service
+            stats.service_max = max(stats.service_max, service)
+            sem.release()
+
+    async def stream(self, capability: str, open_stream: Callable[[], AsyncIterator]) -> AsyncIterator:
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump():
+            try:
+                async with self.slot(capability):
+                    async for item in open_stream():
+                        queue.put_nowait(('item', item))
+                queue.put_nowait(('end', None))
+            except Exception as e:
+                queue.put_nowait(('error', e))
+
+        task = asyncio.ensure_future(pump())
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == 'end':
+                    return
+                if kind == 'error':
+                    raise value
+                yield value
+        finally:
+            # The consumer stopped early: abandon the SDK stream and free the slot
+            task.cancel()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: s.as_dict() for name, s in self.stats.items()}
+
+_limiter: Optional[Limiter] = None
+
+def get_limiter() -> Limiter:
+    global _limiter
+    if _limiter is None:
+        limits = {
+            name: int(os.environ.get(f"RTX_LIMIT_{name.replace('.', '_').upper()}", default))
+            for name, default in DEFAULT_LIMITS.items()
+        }
+        _limiter = Limiter(limits, queue_timeout=float(os.environ.get('RTX_QUEUE_TIMEOUT', 30)))
+    return _limiter
+
+def slot(capability: str):
+    """`async with slot('llm.chat'):` around one SDK call."""
+    return get_limiter().slot(capability)
+
+def stream(capability: str, open_stream: Callable[[], AsyncIterator]) -> AsyncIterator:
+    """`async for item in stream('tts', lambda: sdk_stream(...)):` for one SDK stream."""
+    return get_limiter().stream(capability, open_stream)
+
+# --- Shared HTTP Transport ---
+
+_http_client = None
+
+# SDK modules that create a client per request via `httpx.AsyncClient()`
+SDK_HTTP_MODULES = ['activities', 'api', 'llm', 'tts', 'stt', 'webhook']
+
+def get_http_client(base_url: str = ''):
+    """The shared keep-alive client, created on first use."""
+    global _http_client
+    if _http_client is None:
+        import httpx
+        http2 = False
+        if base_url.startswith('https://'):
+            try:
+                import h2  # noqa: F401
+                http2 = True
+            except ImportError:
+                pass
+        _http_client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=int(os.environ.get('RTX_HTTP_MAX_CONNECTIONS', 20)),
+                max_keepalive_connections=int(os.environ.get('RTX_HTTP_MAX_KEEPALIVE', 10)),
+                keepalive_expiry=float(os.environ.get('RTX_HTTP_KEEPALIVE_EXPIRY', 30)),
+            ),
+        )
+    return _http_client
+
+class _SharedClientHandle:
+    """Stands in for `httpx.AsyncClient()` inside the SDK: hands out the
+    shared client and leaves it open when the `async with` block ends."""
+
+    def __init__(self, *args, **kwargs):
+        import httpx
+        # Clients built with custom settings keep their own transport
+        self._own = httpx.AsyncClient(*args, **kwargs) if (args or kwargs) else None
+
+    async def __aenter__(self):
+        if self._own is not None:
+            return await self._own.__aenter__()
+        return get_http_client()
+
+    async def __aexit__(self, *exc):
+        if self._own is not None:
+            await self._own.__aexit__(*exc)
+
+def install_http_pool(base_url: str = '') -> bool:
+    """Route SDK HTTP traffic through the shared client. Returns True if installed."""
+    import importlib
+    import httpx
+
+    get_http_client(base_url)
+    shim = types.ModuleType('httpx')
+    shim.__dict__.update(httpx.__dict__)
+    shim.AsyncClient = _SharedClientHandle
+    installed = False
+    for name in SDK_HTTP_MODULES:
+        try:
+            module = importlib.import_module(f'realtimex_sdk.{name}')
+        except ImportError:
+            continue
+        if getattr(module, 'httpx', None) is httpx:
+            module.httpx = shim
+            installed = True
+    return installed
+
+async def close_http_pool():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -4,34 +4,14 @@ import json
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from nicegui import ui, app
-from realtimex_sdk import RealtimeXSDK, SDKConfig, PermissionDeniedError, LLMProviderError, LLMPermissionError
-
-# Initialize SDK with all permissions
-sdk = RealtimeXSDK(config=SDKConfig(
-    permissions=[
-        # Activities
-        'activities.read',
-        'activities.write',
-        # API
-        'api.agents',
-        'api.workspaces',
-        'api.threads',
-        'api.task',
-        # Webhook
-        'webhook.trigger',
-        # LLM
-        'llm.chat',
-        'llm.embed',
-        'llm.providers',
-        # Vectors
-        'vectors.read',
-        'vectors.write',
-        # TTS
-        'tts.generate',
-        # STT
-        'stt.listen'
-    ]
-))
+import services
+import activity_feed
+import limits
+import offload
+import profiling
+import rag
+import stt_stream
+import voice
 
 # --- State Management ---
 class State:
@@ -46,6 +26,9 @@ class State:
     tts_providers: List[Dict[str, Any]] = []
     tts_audio_data: bytes = b''
     stt_providers: List[Dict[str, Any]] = []
+    stt_listener: Any = None
+    stt_transcript: List[str] = []
+    voice_pipeline: Any = None
     # Task Simulation
     simulated_task_uuid: str = ""
     simulated_task_status: str = "idle"  # idle, processing, completed, failed
@@ -54,23 +37,28 @@ class State:
     data_dir: str = ""
 
 state = State()
+# Query embeddings are prefetched while the user types in the search box
+rag_prefetcher = rag.EmbeddingPrefetcher()
 
 def add_log(msg: str, type: str = 'info'):
     timestamp = datetime.now().strftime("%H:%M:%S")
     color = "white"
     if type == 'error': color = "red-400"
     elif type == 'success': color = "green-400"
-    
+    elif type == 'warning': color = "yellow-400"
+
     state.logs.append(f'<span class="text-{color}">[{timestamp}] {msg}</span>')
     if len(state.logs) > 100:
         state.logs.pop(0)
     if 'log_area' in globals():
         log_area.set_content("\n".join(state.logs[::-1]))
 
+@profiling.action
 async def refresh_system_status():
     try:
-        state.ping_result = await sdk.ping()
-        state.data_dir = await sdk.get_app_data_dir()
+        status = await services.system_status()
+        state.ping_result = status['ping']
+        state.data_dir = status['data_dir']
         if 'status_card' in globals():
             status_card.update()
         add_log("System status refreshed", 'success')
@@ -78,67 +66,104 @@ async def refresh_system_status():
         add_log(f"System status error: {e}", 'error')
 
 # --- SDK Actions ---
+# UI handlers: read widget values, call the service layer, render the result.
+# `@profiling.action` records wall vs CPU time per handler (Profiling panel).
 
+@profiling.action
 async def refresh_activities():
+    # Goes through the shared feed: one list call, diffs pushed to every open table
     try:
-        raw_activities = await sdk.activities.list(limit=20)
-        state.activities = [{
-            **r,
-            'display_type': r.get('raw_data', {}).get('type', 'N/A'),
-            'display_time': r.get('created_at', '')[:19].replace('T', ' ')
-        } for r in raw_activities]
-        activities_table.update_rows(state.activities)
+        state.activities = await activity_feed.get_feed().refresh_now()
         add_log(f"Loaded {len(state.activities)} activities", 'success')
     except Exception as e:
         add_log(f"Error fetching activities: {e}", 'error')
 
+def follow_activity_feed(table):
+    """Push feed diffs into `table` while its client is connected.
+
+    A client can reconnect after a websocket drop without rebuilding the
+    page, so the subscription is renewed on every connect, catching up on
+    whatever changed in between. The selection survives updates, minus
+    rows that no longer exist.
+    """
+    feed = activity_feed.get_feed()
+    client = ui.context.client
+    unsubscribe = None
+
+    def show(rows):
+        by_id = {r['id']: r for r in rows}
+        table.update_rows(rows, clear_selection=False)
+        table.selected = [by_id[r['id']] for r in table.selected if r['id'] in by_id]
+
+    def attach():
+        nonlocal unsubscribe
+        if unsubscribe is None:
+            show(list(feed.rows))
+            unsubscribe = feed.subscribe(lambda diff: show(diff.apply(table.rows)))
+
+    def detach():
+        nonlocal unsubscribe
+        if unsubscribe is not None:
+            unsubscribe()
+            unsubscribe = None
+
+    attach()
+    client.on_connect(attach)
+    client.on_disconnect(detach)
+
+@profiling.action
 async def create_activity(data_str: str):
     try:
         data = json.loads(data_str)
-        activity = await sdk.activities.insert(data)
+        activity = await services.create_activity(data)
         add_log(f"Created activity: {activity.get('id')}", 'success')
         await refresh_activities()
     except Exception as e:
         add_log(f"Create error: {e}", 'error')
 
+@profiling.action
 async def update_activity(id: str, status: str):
     try:
-        await sdk.activities.update(id, {"status": status})
+        await services.update_activity(id, status)
         add_log(f"Updated {id[:8]} to {status}", 'success')
         await refresh_activities()
     except Exception as e:
         add_log(f"Update error: {e}", 'error')
 
+@profiling.action
 async def delete_activity(id: str):
     try:
-        await sdk.activities.delete(id)
+        await services.delete_activity(id)
         add_log(f"Deleted {id[:8]}", 'success')
         await refresh_activities()
     except Exception as e:
         add_log(f"Delete error: {e}", 'error')
 
+@profiling.action
 async def fetch_agents():
     try:
-        state.agents = await sdk.api.get_agents()
+        state.agents = await services.list_agents()
         agent_select.options = {a['slug']: a['name'] for a in state.agents}
         agent_select.update()
         add_log(f"Fetched {len(state.agents)} agents", 'success')
     except Exception as e:
         add_log(f"Error fetching agents: {e}", 'error')
 
+@profiling.action
 async def fetch_workspaces():
     try:
-        state.workspaces = await sdk.api.get_workspaces()
+        state.workspaces = await services.list_workspaces()
         ws_select.options = {w['slug']: w['name'] for w in state.workspaces}
         ws_select.update()
         add_log(f"Fetched {len(state.workspaces)} workspaces", 'success')
     except Exception as e:
         add_log(f"Error fetching workspaces: {e}", 'error')
 
+@profiling.action
 async def fetch_threads(workspace_slug: str):
     if not workspace_slug: return
     try:
-        threads = await sdk.api.get_threads(workspace_slug)
+        threads = await services.list_threads(workspace_slug)
         options = {'create_new': '➕ Create New Thread'}
         options.update({t['slug']: t['name'] for t in threads})
         thread_select.options = options
@@ -147,6 +172,7 @@ async def fetch_threads(workspace_slug: str):
     except Exception as e:
         add_log(f"Error fetching threads: {e}", 'error')
 
+@profiling.action
 async def trigger_agent():
     auto_run = auto_run_switch.value
     if auto_run and (not agent_select.value or not ws_select.value):
@@ -155,46 +181,48 @@ async def trigger_agent():
     try:
         raw_data = json.loads(raw_data_input.value) if raw_data_input.value else {}
         add_log(f"Triggering ({'auto' if auto_run else 'manual'})...")
-        result = await sdk.webhook.trigger_agent(
+        result = await services.trigger_agent(
             raw_data=raw_data,
             auto_run=auto_run,
             prompt=prompt_input.value,
-            agent_name=agent_select.value if auto_run else None,
-            workspace_slug=ws_select.value if auto_run else None,
-            thread_slug=thread_select.value if auto_run and thread_select.value != 'create_new' else None
+            agent_name=agent_select.value,
+            workspace_slug=ws_select.value,
+            thread_slug=thread_select.value
         )
         add_log(f"SUCCESS! Task: {result.get('task_uuid')}", 'success')
         task_uuid_input.value = result.get('task_uuid')
     except Exception as e:
         add_log(f"Trigger failed: {e}", 'error')
 
+@profiling.action
 async def fetch_task_status():
     uuid = task_uuid_input.value.strip()
     if not uuid: return
     try:
-        task_data = await sdk.api.get_task(uuid)
+        task_data = await services.get_task(uuid)
         status = task_data.get('status', 'unknown')
         task_status_label.set_text(f"Status: {status} | Source: {task_data.get('sourceAppName', '-')}")
-        
+
         # Correctly update JsonEditor properties
         task_meta_area.properties['content'] = {'json': task_data}
         task_meta_area.update()
-        
+
         add_log(f"Task {uuid[:8]}: {status}", 'success')
     except Exception as e:
         add_log(f"Fetch failed: {e}", 'error')
 
 # --- Task Simulation Actions ---
 
+@profiling.action
 async def start_simulated_task():
     try:
         uuid = task_uuid_input.value.strip()
         if not uuid:
             ui.notify("Enter Task UUID to simulate", type='warning')
             return
-        
+
         add_log(f"Reporting task STARTED: {uuid[:8]}...")
-        await sdk.task.start(uuid)
+        await services.start_task(uuid)
         state.simulated_task_uuid = uuid
         state.simulated_task_status = "processing"
         add_log("Status: PROCESSING", 'success')
@@ -202,35 +230,35 @@ async def start_simulated_task():
     except Exception as e:
         add_log(f"Task Start Error: {e}", 'error')
 
+@profiling.action
 async def complete_simulated_task():
     try:
         if not state.simulated_task_uuid: return
         add_log(f"Reporting task COMPLETE: {state.simulated_task_uuid[:8]}...")
-        await sdk.task.complete(state.simulated_task_uuid, result={"message": "Task processed successfully via Python SDK Demo"})
+        await services.complete_task(state.simulated_task_uuid, result={"message": "Task processed successfully via Python SDK Demo"})
         state.simulated_task_status = "completed"
         add_log("Status: COMPLETED", 'success')
         await fetch_task_status()
     except Exception as e:
         add_log(f"Task Complete Error: {e}", 'error')
 
+@profiling.action
 async def fail_simulated_task(error_msg: str):
     try:
         if not state.simulated_task_uuid: return
         add_log(f"Reporting task FAILED: {state.simulated_task_uuid[:8]}...")
-        await sdk.task.fail(state.simulated_task_uuid, error=error_msg)
+        await services.fail_task(state.simulated_task_uuid, error=error_msg)
         state.simulated_task_status = "failed"
         add_log(f"Status: FAILED ({error_msg})", 'error')
         await fetch_task_status()
     except Exception as e:
         add_log(f"Task Fail Error: {e}", 'error')
 
+@profiling.action
 async def fetch_vector_workspaces():
     try:
-        res = await sdk.llm.vectors.list_workspaces()
-        if res.success:
-            workspaces = res.workspaces
-            if 'default' not in workspaces:
-                workspaces = ['default'] + workspaces
+        workspaces = await services.list_vector_workspaces()
+        if workspaces is not None:
             vector_workspace_id.options = workspaces
             vector_workspace_id.update()
             add_log(f"Fetched {len(workspaces)} vector workspaces", 'success')
@@ -239,35 +267,18 @@ async def fetch_vector_workspaces():
 
 # --- LLM Actions ---
 
+@profiling.action
 async def fetch_providers():
     try:
         add_log("Fetching available models...")
-        # Load from separate endpoints
-        chat_res = await sdk.llm.chat_providers()
-        embed_res = await sdk.llm.embed_providers()
-        
-        state.providers = {
-            'llm': chat_res.get('providers', []),
-            'embedding': embed_res.get('providers', [])
-        }
-        
-        # Build options for chat
-        chat_opts = {}
-        for p in state.providers['llm']:
-            provider_name = p.get('provider')
-            for m in p.get('models', []):
-                val = f"{provider_name}/{m['id']}"
-                chat_opts[val] = f"[{provider_name}] {m['id']}"
+        res = await services.list_providers()
+        state.providers = res['providers']
+
+        chat_opts = res['chat_options']
         chat_model_select.options = chat_opts
         chat_model_select.update()
 
-        # Build options for embedding
-        embed_opts = {}
-        for p in state.providers['embedding']:
-            provider_name = p.get('provider')
-            for m in p.get('models', []):
-                val = f"{provider_name}/{m['id']}"
-                embed_opts[val] = f"[{provider_name}] {m['id']}"
+        embed_opts = res['embed_options']
         embed_model_select.options = embed_opts
         embed_model_select.update()
 
@@ -277,59 +288,114 @@ async def fetch_providers():
     except Exception as e:
         add_log(f"Providers error: {e}", 'error')
 
+def show_embed_tuning():
+    provider, model = services.split_model(embed_model_select.value)
+    settings = services.embed_tuner.get_store().get(provider, model)
+    if settings:
+        embed_tuning_label.set_text(f"Tuned: batch {settings.batch_size} × {settings.concurrency} parallel "
+                                    f"({settings.chunks_per_sec:.1f} chunks/s)")
+    else:
+        embed_tuning_label.set_text("Not tuned (ingestion sends one request)")
+
+@profiling.action
+async def tune_embeddings():
+    provider, model = services.split_model(embed_model_select.value)
+    add_log(f"Tuning embeddings for {embed_model_select.value or 'default model'}...")
+    embed_tuning_label.set_text("Tuning...")
+
+    def log_probe(probe):
+        if probe.error:
+            add_log(f"Probe batch {probe.batch_size} × {probe.concurrency}: {probe.error}", 'error')
+        else:
+            add_log(f"Probe batch {probe.batch_size} × {probe.concurrency}: {probe.chunks_per_sec:.1f} chunks/s")
+
+    try:
+        samples = [t.strip() for t in embed_store_texts.value.split('\n') if t.strip()]
+        settings = await services.autotune_embeddings(provider, model, sample_texts=samples, on_probe=log_probe)
+        if settings:
+            add_log(f"Tuned: batch {settings.batch_size} × {settings.concurrency} ({settings.chunks_per_sec:.1f} chunks/s)", 'success')
+        else:
+            add_log("Tuning failed: every probe errored", 'error')
+    except Exception as e:
+        handle_llm_error(e)
+    show_embed_tuning()
+
+@profiling.action
 async def send_chat():
     try:
         messages = json.loads(chat_messages.value)
         chat_resp_area.set_visibility(True)
         chat_resp_area.set_content("Thinking...")
-        
-        provider = None
-        model = None
-        if chat_model_select.value:
-            provider, model = chat_model_select.value.split('/', 1)
+
+        provider, model = services.split_model(chat_model_select.value)
 
         response_format = None
         if json_mode_switch.value:
             response_format = {"type": "json_object"}
 
+        options = {
+            'model': model,
+            'provider': provider,
+            'response_format': response_format,
+            'cache': chat_cache_switch.value,
+            'on_cache_hit': log_cache_hit,
+        }
+        chat_fn, chat_stream_fn = services.chat, services.chat_stream
+        if session_switch.value:
+            # Messages JSON is appended to the session history instead of sent as-is
+            session_id = session_select.value or new_chat_session()
+            options.update(budget=int(token_budget_input.value or 0) or None, on_context=log_session_context)
+            chat_fn = lambda m, **kw: services.session_chat(session_id, m, **kw)
+            chat_stream_fn = lambda m, **kw: services.session_chat_stream(session_id, m, **kw)
+
         if chat_stream_switch.value:
             add_log("Starting streaming chat...")
             chat_resp_area.set_content("")
-            
-            async for chunk in sdk.llm.chat_stream(
-                messages, 
-                model=model, 
-                provider=provider,
-                response_format=response_format
-            ):
-                # The SDK now returns an object with textResponse property
-                text = getattr(chunk, 'textResponse', '') or getattr(chunk, 'text', '')
-                if text:
-                    chat_resp_area.content += text
-                    chat_resp_area.update()
+
+            async for text in chat_stream_fn(messages, **options):
+                chat_resp_area.content += text
+                chat_resp_area.update()
             add_log("Stream complete", 'success')
         else:
             add_log("Sending chat request...")
-            res = await sdk.llm.chat(
-                messages, 
-                model=model, 
-                provider=provider,
-                response_format=response_format
-            )
-            chat_resp_area.set_content(res.get('response', {}).get('content', 'No content'))
+            content = await chat_fn(messages, **options)
+            chat_resp_area.set_content(content)
             add_log("Chat complete", 'success')
     except Exception as e:
         handle_llm_error(e)
 
+def log_session_context(ctx):
+    add_log(f"Session context: {ctx.sent_tokens}/{ctx.full_tokens} tokens sent, "
+            f"{ctx.saved_tokens} saved ({ctx.dropped} older messages pruned)", 'success')
+
+def refresh_chat_sessions():
+    session_select.options = {s['id']: s['title'] for s in services.list_sessions()}
+    session_select.update()
+
+@profiling.action
+def new_chat_session() -> str:
+    session = services.create_session()
+    refresh_chat_sessions()
+    session_select.value = session.id
+    add_log(f"Started chat session {session.id}", 'success')
+    return session.id
+
+def log_cache_hit(hit):
+    detail = f" (similarity {hit.similarity:.3f})" if hit.kind == 'semantic' else ''
+    add_log(f"Chat cache hit: {hit.kind}{detail}", 'success')
+
+@profiling.action
+def clear_chat_cache():
+    services.chat_cache.get_cache().clear()
+    add_log("Chat cache cleared", 'success')
+
+@profiling.action
 async def generate_embedding():
     try:
         add_log("Generating embedding...")
-        provider = None
-        model = None
-        if embed_model_select.value:
-            provider, model = embed_model_select.value.split('/', 1)
-            
-        res = await sdk.llm.embed(embed_input.value, provider=provider, model=model)
+        provider, model = services.split_model(embed_model_select.value)
+
+        res = await services.embed(embed_input.value, provider=provider, model=model)
         vec = res.get('embeddings', [[]])[0]
         embed_res_area.set_visibility(True)
         embed_res_area.set_content(f"Dims: {res.get('dimensions')}\nFirst 5: {vec[:5]}")
@@ -337,79 +403,112 @@ async def generate_embedding():
     except Exception as e:
         handle_llm_error(e)
 
+@profiling.action
 async def embed_and_store():
     try:
         texts = [t.strip() for t in embed_store_texts.value.split('\n') if t.strip()]
         add_log(f"Embedding and storing {len(texts)} texts...")
-        
-        provider = None
-        model = None
-        if embed_model_select.value:
-            provider, model = embed_model_select.value.split('/', 1)
-            
-        res = await sdk.llm.embed_and_store(
-            texts, 
+
+        provider, model = services.split_model(embed_model_select.value)
+
+        res = await services.embed_and_store(
+            texts,
             document_id=embed_store_doc_id.value or None,
             workspace_id=vector_workspace_id.value or None,
             provider=provider,
             model=model
         )
         vector_res_area.set_visibility(True)
-        vector_res_area.set_content(f"**Success!** Stored {len(texts)} items.")
+        if res['failed']:
+            vector_res_area.set_content(f"**Partial failure:** stored {res['stored']} of {len(texts)} items.")
+            for error in res['errors']:
+                add_log(f"Store batch failed: {error}", 'error')
+            return
+        vector_res_area.set_content(f"**Success!** Stored {res['stored']} items.")
         add_log("Store success", 'success')
         vector_panels.value = 'search'
     except Exception as e:
         handle_llm_error(e)
 
+@profiling.action
 async def semantic_search():
     try:
         query = search_query.value
         top_k = int(search_top_k.value or 3)
         add_log(f"Searching for: {query[:30]}...")
-        
-        provider = None
-        model = None
-        if embed_model_select.value:
-            provider, model = embed_model_select.value.split('/', 1)
-            
-        res = await sdk.llm.search(
-            query, 
-            top_k=top_k, 
+
+        provider, model = services.split_model(embed_model_select.value)
+
+        res = await services.search(
+            query,
+            top_k=top_k,
             workspace_id=vector_workspace_id.value or None,
             document_id=search_doc_id.value or None,
-            provider=provider, 
+            provider=provider,
             model=model
         )
         vector_res_area.set_visibility(True)
-        if res:
-            out = ""
-            for i, r in enumerate(res):
-                out += f"**Match #{i+1}** (Score: {r['score']:.3f})\n"
-                out += f"> {r.get('metadata', {}).get('text', r['id'])[:200]}\n\n"
-            vector_res_area.set_content(out)
-        else:
-            vector_res_area.set_content("*No results found*")
+        vector_res_area.set_content(services.format_search_results(res))
         add_log("Search complete", 'success')
     except Exception as e:
         handle_llm_error(e)
 
+def prefetch_query_embedding(e):
+    provider, model = services.split_model(embed_model_select.value)
+    rag_prefetcher.prefetch(e.value or '', provider=provider, model=model)
+
+@profiling.action
+async def rag_answer():
+    query = (search_query.value or '').strip()
+    if not query:
+        ui.notify("Enter a question", type='warning')
+        return
+    try:
+        top_k = int(search_top_k.value or 3)
+        add_log(f"RAG answer for: {query[:30]}...")
+        embed_provider, embed_model = services.split_model(embed_model_select.value)
+        chat_provider, chat_model = services.split_model(chat_model_select.value)
+        timings = rag.RagTimings()
+        sources = ""
+
+        def show_matches(matches):
+            nonlocal sources
+            sources = services.format_search_results(matches)
+            vector_res_area.set_content(f"{sources}---\n\n*Generating...*")
+
+        vector_res_area.set_visibility(True)
+        vector_res_area.set_content("*Retrieving...*")
+        answer = ""
+        async for text in rag.answer_stream(
+            query,
+            rag_prefetcher,
+            timings,
+            top_k=top_k,
+            workspace_id=vector_workspace_id.value or None,
+            document_id=search_doc_id.value or None,
+            embed_provider=embed_provider,
+            embed_model=embed_model,
+            chat_provider=chat_provider,
+            chat_model=chat_model,
+            on_matches=show_matches
+        ):
+            answer += text
+            vector_res_area.set_content(f"{sources}---\n\n**Answer:** {answer}")
+        vector_res_area.set_content(f"{sources}---\n\n**Answer:** {answer}\n\n`{timings.summary()}`")
+        add_log(f"RAG complete: {timings.summary()}", 'success')
+    except Exception as e:
+        handle_llm_error(e)
+
 def handle_llm_error(e):
-    if isinstance(e, LLMPermissionError):
-        add_log(f"Permission Required: {e.permission}", 'error')
-    elif isinstance(e, LLMProviderError):
-        add_log(f"Provider Error: {e.message} (Code: {e.code})", 'error')
-    else:
-        add_log(f"Error: {e}", 'error')
+    add_log(services.describe_error(e), 'error')
 
+@profiling.action
 async def delete_all_vectors():
     ws_id = vector_workspace_id.value or "all"
     if await ui.run_javascript(f'confirm("Delete all vectors in \'{ws_id}\'?")'):
         try:
             add_log(f"Deleting vectors in {ws_id}...")
-            res = await sdk.llm.vectors.delete(
-                delete_all=True, 
-                workspace_id=vector_workspace_id.value or None
-            )
+            await services.delete_all_vectors(workspace_id=vector_workspace_id.value or None)
             add_log("All vectors deleted", 'success')
             vector_res_area.set_content("All vectors deleted.")
         except Exception as e:
@@ -417,48 +516,42 @@ async def delete_all_vectors():
 
 # --- TTS Actions ---
 
+@profiling.action
 async def fetch_tts_providers():
     try:
         add_log("Fetching TTS providers...")
-        providers = await sdk.tts.list_providers()
-        state.tts_providers = providers
-        
+        state.tts_providers = await services.list_tts_providers()
+
         # Build select options
-        opts = {}
-        for p in providers:
-            if p.get('configured'):
-                provider_id = p.get('id')
-                name = p.get('name', provider_id)
-                ptype = p.get('type', 'unknown')
-                opts[provider_id] = f"[{ptype}] {name}"
-        
+        opts = services.tts_provider_options(state.tts_providers)
         tts_provider_select.options = opts
         tts_provider_select.update()
-        
+
         # Also update voices when provider changes
         add_log(f"Loaded {len(opts)} configured TTS providers", 'success')
     except Exception as e:
         add_log(f"TTS providers error: {e}", 'error')
 
+@profiling.action
 async def update_tts_voices():
     provider_id = tts_provider_select.value
     if not provider_id:
         return
-    
+
     # Find provider config
     provider = next((p for p in state.tts_providers if p.get('id') == provider_id), None)
     if not provider:
         return
-    
+
     config = provider.get('config', {})
     voices = config.get('voices', [])
-    
+
     # Update voice select
     voice_opts = {v: v for v in voices}
     tts_voice_select.options = voice_opts
     tts_voice_select.value = voices[0] if voices else None
     tts_voice_select.update()
-    
+
     # Languages for some providers
     languages = config.get('languages', [])
     if languages:
@@ -468,106 +561,89 @@ async def update_tts_voices():
     else:
         tts_language_select.set_visibility(False)
 
+def tts_options() -> Dict[str, Any]:
+    return {
+        'provider': tts_provider_select.value,
+        'voice': tts_voice_select.value,
+        'speed': float(tts_speed_input.value or 1.0),
+        'language': tts_language_select.value if tts_language_select.visible else None,
+        'num_inference_steps': int(tts_quality_input.value or 10),
+    }
+
+@profiling.action
 async def tts_speak():
     text = tts_text_input.value.strip()
     if not text:
         ui.notify("Enter text to speak", type='warning')
         return
-    
+
     try:
         add_log("Generating TTS audio (buffer)...")
         tts_status_label.set_text("Generating...")
-        
-        provider = tts_provider_select.value
-        voice = tts_voice_select.value
-        speed = float(tts_speed_input.value or 1.0)
-        language = tts_language_select.value if tts_language_select.visible else None
-        
-        audio_bytes = await sdk.tts.speak(
-            text,
-            voice=voice,
-            speed=speed,
-            provider=provider,
-            language=language,
-            num_inference_steps=int(tts_quality_input.value or 10) if 'tts_quality_input' in globals() else None
-        )
-        
+
+        audio_bytes = await services.tts_speak(text, **tts_options())
+
         state.tts_audio_data = audio_bytes
         tts_status_label.set_text(f"Generated {len(audio_bytes)} bytes")
         add_log(f"TTS complete: {len(audio_bytes)} bytes", 'success')
-        
+
         # Play audio in browser via base64
-        import base64
-        audio_b64 = base64.b64encode(audio_bytes).decode()
+        url = await services.audio_data_url_async(audio_bytes)
         await ui.run_javascript(f'''
-            let audio = new Audio("data:audio/wav;base64,{audio_b64}");
+            let audio = new Audio("{url}");
             audio.play();
         ''')
-        
+
     except Exception as e:
         add_log(f"TTS speak error: {e}", 'error')
         tts_status_label.set_text(f"Error: {str(e)[:50]}")
 
+@profiling.action
 async def tts_speak_stream():
     text = tts_text_input.value.strip()
     if not text:
         ui.notify("Enter text to speak", type='warning')
         return
-    
+
     try:
         add_log("Starting TTS streaming...")
         tts_status_label.set_text("Streaming...")
-        
-        provider = tts_provider_select.value
-        voice = tts_voice_select.value
-        speed = float(tts_speed_input.value or 1.0)
-        language = tts_language_select.value if tts_language_select.visible else None
-        num_inference_steps = int(tts_quality_input.value or 10)
-        
+
         all_audio = b''
         chunk_count = 0
-        
-        async for chunk in sdk.tts.speak_stream(
-            text,
-            voice=voice,
-            speed=speed,
-            provider=provider,
-            language=language,
-            num_inference_steps=num_inference_steps
-        ):
+
+        async for chunk in services.tts_speak_stream(text, **tts_options()):
             chunk_count += 1
             audio_bytes = chunk.get('audio', b'')
             all_audio += audio_bytes
             tts_status_label.set_text(f"Chunk {chunk.get('index', 0)+1}/{chunk.get('total', '?')} - {len(audio_bytes)} bytes")
             add_log(f"Received chunk {chunk.get('index', 0)+1}/{chunk.get('total', '?')}", 'info')
-            
+
             # Play each chunk immediately
-            import base64
-            audio_b64 = base64.b64encode(audio_bytes).decode()
-            mime = chunk.get('mimeType', 'audio/wav')
+            url = await services.audio_data_url_async(audio_bytes, chunk.get('mimeType', 'audio/wav'))
             await ui.run_javascript(f'''
-                let audio = new Audio("data:{mime};base64,{audio_b64}");
+                let audio = new Audio("{url}");
                 audio.play();
             ''')
-        
+
         state.tts_audio_data = all_audio
         add_log(f"Streaming complete: {chunk_count} chunks, {len(all_audio)} bytes total", 'success')
         tts_status_label.set_text(f"Complete: {chunk_count} chunks")
-        
+
     except Exception as e:
         add_log(f"TTS stream error: {e}", 'error')
         tts_status_label.set_text(f"Error: {str(e)[:50]}")
 
+@profiling.action
 async def tts_download():
     if not state.tts_audio_data:
         ui.notify("No audio to download", type='warning')
         return
-    
-    import base64
-    audio_b64 = base64.b64encode(state.tts_audio_data).decode()
+
+    url = await services.audio_data_url_async(state.tts_audio_data)
     await ui.run_javascript(f'''
         let link = document.createElement('a');
-        link.href = "data:audio/wav;base64,{audio_b64}";
+        link.href = "{url}";
         link.download = "tts_audio.wav";
         link.click();
     ''')
@@ -575,52 +651,54 @@ async def tts_download():
 
 # --- STT Actions ---
 
+@profiling.action
 async def fetch_stt_providers():
     try:
         add_log("Fetching STT providers...")
-        res = await sdk.stt.list_providers()
-        state.stt_providers = res.get('providers', [])
-        
+        state.stt_providers = await services.list_stt_providers()
+
         # Build options
         p_opts = {p['id']: p['name'] for p in state.stt_providers}
         stt_provider_select.options = p_opts
-        
+
         # Default to first if available
         if p_opts:
             stt_provider_select.value = list(p_opts.keys())[0]
-            
+
         stt_provider_select.update()
         update_stt_models()
-        
+
         add_log(f"Loaded {len(state.stt_providers)} STT providers", 'success')
     except Exception as e:
          add_log(f"STT providers error: {e}", 'error')
 
+@profiling.action
 def update_stt_models():
     p_id = stt_provider_select.value
-    if not p_id: 
+    if not p_id:
         stt_model_select.options = {}
         stt_model_select.update()
         return
-    
+
     provider = next((p for p in state.stt_providers if p['id'] == p_id), None)
     if not provider: return
-    
+
     m_opts = {m['id']: m['name'] for m in provider.get('models', [])}
     stt_model_select.options = m_opts
     if m_opts:
         stt_model_select.value = list(m_opts.keys())[0]
     stt_model_select.update()
 
+@profiling.action
 async def stt_listen():
     try:
         stt_status_label.set_text("Listening...")
-        
-        res = await sdk.stt.listen(options={
-            "provider": stt_provider_select.value,
-            "model": stt_model_select.value
-        })
-        
+
+        res = await services.stt_listen(
+            provider=stt_provider_select.value,
+            model=stt_model_select.value
+        )
+
         if res.get('success'):
             text = res.get('text', '')
             stt_status_label.set_text(f'"{text}"')
@@ -629,28 +707,233 @@ async def stt_listen():
             err = res.get('error', 'Unknown error')
             stt_status_label.set_text(f"Error: {err}")
             add_log(f"STT Error: {err}", 'error')
-            
+
     except Exception as e:
         add_log(f"STT exception: {e}", 'error')
         stt_status_label.set_text("Error")
 
+async def toggle_continuous_stt():
+    if state.stt_listener and not state.stt_listener.stopped:
+        state.stt_listener.stop()
+        stt_continuous_button.set_text('🔁 Continuous')
+        stt_status_label.set_text("Stopping after current segment...")
+        return
+
+    listener = stt_stream.ContinuousListener(
+        provider=stt_provider_select.value,
+        model=stt_model_select.value,
+        segment_ms=int(stt_segment_input.value or 4000)
+    )
+    state.stt_listener = listener
+    state.stt_transcript = []
+    stt_continuous_button.set_text('⏹ Stop')
+    stt_transcript_area.set_visibility(True)
+    stt_transcript_area.set_content("")
+    stt_status_label.set_text("Listening continuously...")
+    add_log("Continuous STT started")
+    try:
+        async for event in listener.events():
+            if event.kind == 'partial':
+                stt_status_label.set_text(f'… {event.text}')
+            elif event.kind == 'final':
+                state.stt_transcript.append(event.text)
+                stt_transcript_area.set_content("\n\n".join(state.stt_transcript))
+                stt_status_label.set_text("Listening continuously...")
+                add_log(f"STT final (end confirmed {event.finalize_ms:.0f}ms after last text): {event.text}", 'success')
+            else:
+                add_log(f"STT Error: {event.text}", 'error')
+    except Exception as e:
+        add_log(f"STT exception: {e}", 'error')
+    finally:
+        listener.stop()
+        stt_continuous_button.set_text('🔁 Continuous')
+        stt_status_label.set_text("Stopped")
+        add_log("Continuous STT stopped")
+
+# --- Capacity ---
+
+def refresh_capacity():
+    rows = []
+    for name, st in services.capacity_stats().items():
+        if not (st['calls'] or st['in_flight'] or st['queued']):
+            continue
+        rows.append(f"{name:<11} {st['in_flight']}/{st['limit']} q{st['queued']:<2} "
+                    f"wait {st['wait_avg_ms']:>6.0f}ms  svc {st['service_avg_ms']:>6.0f}ms"
+                    + (f"  rejected {st['rejected']}" if st['rejected'] else ''))
+    capacity_area.set_text("\n".join(rows) or "No SDK calls yet")
+
+# --- Profiling ---
+
+def log_loop_lag(lag: float, active: List[str]):
+    culprits = f" while running: {', '.join(active)}" if active else ""
+    add_log(f"Event loop blocked for {lag * 1000:.0f}ms{culprits}", 'warning')
+
+def refresh_profiling():
+    lag = profiling.get_monitor().stats.as_dict()
+    rows = [f"loop lag   last {lag['lag_last_ms']:>5.0f}ms  avg {lag['lag_avg_ms']:>5.0f}ms  "
+            f"max {lag['lag_max_ms']:>5.0f}ms  alerts {lag['alerts']}"]
+    actions = sorted(profiling.action_stats().items(), key=lambda kv: -kv[1]['blocked_avg_ms'] * kv[1]['calls'])
+    for name, st in actions[:10]:
+        rows.append(f"{name[:18]:<18} x{st['calls']:<3} wall {st['wall_avg_ms']:>6.0f}ms  "
+                    f"block {st['blocked_avg_ms']:>5.0f}ms  cpu {st['cpu_avg_ms']:>5.0f}ms  "
+                    f"step {st['step_max_ms']:>5.0f}ms")
+    # Payload processing: loop-blocking time vs time spent in the worker pools
+    for op, st in offload.stats().items():
+        rows.append(f"{op:<18} {st['inline']} inline/{st['offloaded']} off  block {st['blocking_max_ms']:>5.1f}ms  "
+                    f"pool {st['offload_avg_ms']:>5.0f}ms")
+    profiling_area.set_text("\n".join(rows))
+
+    capture = profiling.get_capture()
+    if capture.running:
+        profile_status_label.set_text(f"Capturing... {capture.remaining} action(s) left")
+    elif capture.armed:
+        profile_status_label.set_text(f"Armed: next {capture.remaining} action(s)")
+    elif capture.last_path:
+        profile_status_label.set_text(os.path.basename(capture.last_path))
+    profile_capture_button.set_text('Cancel' if capture.armed else 'Capture')
+    profile_download_button.set_enabled(bool(capture.last_path) and not capture.armed)
+
+def toggle_profile_capture():
+    capture = profiling.get_capture()
+    if capture.armed:
+        capture.cancel()
+        profile_status_label.set_text("Capture cancelled")
+        add_log("Profile capture cancelled")
+    else:
+        n = int(profile_actions_input.value or 5)
+        capture.arm(n, on_done=lambda path: add_log(f"Profile captured: {os.path.basename(path)}", 'success'))
+        add_log(f"Profiling the next {n} action(s) (cProfile + tracemalloc)")
+    refresh_profiling()
+    if capture.error:
+        add_log(f"Profile capture failed: {capture.error}", 'error')
+
+def download_profile():
+    path = profiling.get_capture().last_path
+    if path and os.path.exists(path):
+        ui.download(path)
+
+# --- Voice Assistant ---
+
+# Sequential audio queue in the browser, so sentence clips play back in order
+# and barge-in can drop whatever has not been played yet. When the queue runs
+# dry the page emits `rtx_voice_idle`, which ends the pipeline's playback window.
+VOICE_PLAYER_JS = '''
+<script>
+window.rtxVoice = {
+    queue: [], current: null,
+    enqueue(url) { this.queue.push(url); if (!this.current) this.next(); },
+    next() {
+        const url = this.queue.shift();
+        if (!url) { this.current = null; emitEvent('rtx_voice_idle'); return; }
+        this.current = new Audio(url);
+        this.current.onended = this.current.onerror = () => this.next();
+        this.current.play().catch(() => this.next());
+    },
+    stop() { this.queue = []; if (this.current) { this.current.pause(); this.current = null; } },
+};
+</script>
+'''
+
+def voice_playback_idle():
+    if state.voice_pipeline:
+        state.voice_pipeline.playback_idle()
+
+async def toggle_voice_assistant():
+    if state.voice_pipeline:
+        state.voice_pipeline.stop()
+        voice_button.set_text('🗣 Start Voice Assistant')
+        voice_status_label.set_text("Stopping after current segment...")
+        return
+
+    chat_provider, chat_model = services.split_model(chat_model_select.value)
+    # Replies are produced in tasks of their own, which have no NiceGUI slot
+    # context, so JavaScript goes to this page's client explicitly
+    client = ui.context.client
+
+    def show_turn(timings):
+        if timings.error:
+            add_log(f"Voice turn failed: {timings.error}", 'error')
+        elif timings.interrupted:
+            add_log("Voice turn interrupted (barge-in)")
+        else:
+            voice_latency_label.set_text(timings.summary())
+            add_log(f"Voice turn: {timings.summary()}", 'success')
+
+    def show_transcript(text):
+        voice_resp_area.set_content(f"**You:** {text}\n\n**Assistant:** ")
+        voice_status_label.set_text("Thinking...")
+
+    def show_text(delta):
+        voice_resp_area.content += delta
+        voice_resp_area.update()
+
+    async def play_audio(audio, mime):
+        url = await services.audio_data_url_async(audio, mime)
+        await client.run_javascript(f'rtxVoice.enqueue("{url}")')
+
+    async def barge_in():
+        await client.run_javascript('rtxVoice.stop()')
+        add_log("Barge-in: queued audio cancelled")
+
+    async def is_playing():
+        return bool(await client.run_javascript('rtxVoice.current !== null || rtxVoice.queue.length > 0'))
+
+    pipeline = voice.VoicePipeline(
+        stt_stream.ContinuousListener(
+            provider=stt_provider_select.value,
+            model=stt_model_select.value,
+            segment_ms=int(stt_segment_input.value or 4000)
+        ),
+        tts_options=tts_options(),
+        chat_provider=chat_provider,
+        chat_model=chat_model,
+        on_partial=lambda text: voice_status_label.set_text(f'… {text}'),
+        on_transcript=show_transcript,
+        on_text=show_text,
+        on_audio=play_audio,
+        on_barge_in=barge_in,
+        on_turn_done=show_turn,
+        allow_barge_in=voice_barge_in_switch.value,
+        is_playing=is_playing
+    )
+    state.voice_pipeline = pipeline
+    voice_button.set_text('⏹ Stop Voice Assistant')
+    voice_resp_area.set_visibility(True)
+    voice_status_label.set_text("Listening...")
+    add_log("Voice assistant started")
+    try:
+        await pipeline.run()
+    except Exception as e:
+        add_log(f"Voice assistant error: {e}", 'error')
+    finally:
+        state.voice_pipeline = None
+        voice_button.set_text('🗣 Start Voice Assistant')
+        voice_status_label.set_text("Stopped")
+        add_log("Voice assistant stopped")
+
 # --- UI Layout ---
 
 
 @ui.page('/')
 async def main_page():
     # Explicitly register with RealtimeX to trigger upfront permission prompt in Production mode
-    await sdk.register()
+    await services.register()
 
     global log_area, activities_table, agent_select, ws_select, thread_select, prompt_input, raw_data_input, auto_run_switch, task_uuid_input, task_status_label, task_meta_area
     global chat_messages, chat_model_select, chat_stream_switch, chat_resp_area, embed_input, embed_res_area, providers_label
     global embed_store_texts, embed_store_doc_id, search_query, search_top_k, vector_res_area, vector_panels, embed_model_select
     global tts_provider_select, tts_voice_select, tts_language_select, tts_text_input, tts_speed_input, tts_quality_input, tts_status_label
     global stt_provider_select, stt_model_select, stt_status_label
-    global status_card
-    global json_mode_switch, vector_workspace_id, search_doc_id
+    global stt_continuous_button, stt_segment_input, stt_transcript_area
+    global voice_button, voice_status_label, voice_latency_label, voice_resp_area, voice_barge_in_switch
+    global status_card, capacity_area, embed_tuning_label
+    global profiling_area, profile_actions_input, profile_capture_button, profile_download_button, profile_status_label
+    global json_mode_switch, chat_cache_switch, vector_workspace_id, search_doc_id
+    global session_switch, session_select, token_budget_input
 
     ui.colors(primary='#3b82f6', secondary='#10b981', accent='#f59e0b')
+    ui.add_head_html(VOICE_PLAYER_JS)
+    ui.on('rtx_voice_idle', voice_playback_idle)
 
     @ui.refreshable
     def status_card():
@@ -670,7 +953,7 @@ async def main_page():
                     ui.label(state.ping_result.get('mode', 'Unknown').upper()).classes('text-xs font-bold text-blue-600')
                 with ui.column().classes('gap-0'):
                     ui.label('Port').classes('text-[10px] uppercase text-gray-400 font-bold')
-                    ui.label(str(sdk.port.get_port())).classes('text-xs font-mono')
+                    ui.label(str(services.get_port())).classes('text-xs font-mono')
                 with ui.column().classes('gap-0 flex-1'):
                     ui.label('Storage Path').classes('text-[10px] uppercase text-gray-400 font-bold')
                     ui.label(state.data_dir or 'Not loaded').classes('text-[10px] truncate max-w-xs')
@@ -716,7 +999,9 @@ async def main_page():
                             {'name': 'status', 'label': 'Status', 'field': 'status'},
                             {'name': 'created_at', 'label': 'Created', 'field': 'display_time'},
                         ]
-                        activities_table = ui.table(columns=columns, rows=[], row_key='id', selection='single').classes('w-full')
+                        feed = activity_feed.get_feed()
+                        activities_table = ui.table(columns=columns, rows=list(feed.rows), row_key='id', selection='single').classes('w-full')
+                        follow_activity_feed(activities_table)
                         
                         with ui.row().classes('w-full justify-end gap-2 mt-4'):
                             ui.button('Refresh', icon='refresh', on_click=refresh_activities).props('outline size=sm')
@@ -778,7 +1063,10 @@ async def main_page():
                             ui.label('🔌 Model Configuration').classes('text-md font-bold text-green-600 mb-2')
                             ui.button('Fetch Available Models', on_click=fetch_providers).props('color=green').classes('w-full')
                             chat_model_select = ui.select(label='Chat Model', options={}).classes('w-full')
-                            embed_model_select = ui.select(label='Embedding Model', options={}).classes('w-full')
+                            with ui.row().classes('w-full items-end gap-2 no-wrap'):
+                                embed_model_select = ui.select(label='Embedding Model', options={}, on_change=show_embed_tuning).classes('flex-1')
+                                ui.button(icon='tune', on_click=tune_embeddings).props('flat round size=sm').tooltip('Autotune batch size / concurrency for this model')
+                            embed_tuning_label = ui.label('').classes('text-xs text-gray-400')
                             providers_label = ui.label('Click to load models...').classes('text-xs text-gray-500 mt-1')
 
                         # Chat
@@ -787,7 +1075,14 @@ async def main_page():
                             with ui.row().classes('w-full justify-between items-center bg-gray-50 p-2 rounded'):
                                 chat_stream_switch = ui.switch('Streaming', value=True)
                                 json_mode_switch = ui.switch('JSON Mode', value=False)
+                                chat_cache_switch = ui.switch('Cache', value=services.chat_cache.get_cache().config.enabled)
+                                ui.button(icon='cleaning_services', on_click=clear_chat_cache).props('flat round size=sm').tooltip('Clear chat cache')
                                 ui.button('SEND', on_click=send_chat).props('color=blue px-6')
+                            with ui.row().classes('w-full items-end gap-2 no-wrap'):
+                                session_switch = ui.switch('Session', value=False).tooltip('Keep history server-side and prune it to the token budget')
+                                session_select = ui.select(label='Chat Session', options={}).classes('flex-1')
+                                token_budget_input = ui.number(label='Token Budget', value=services.chat_sessions.DEFAULT_BUDGET, min=100, step=100).classes('w-24')
+                                ui.button(icon='add', on_click=new_chat_session).props('flat round size=sm').tooltip('New session')
                             chat_messages = ui.textarea(label='Messages JSON', value='[{"role":"user","content":"Hello!"}]').classes('w-full font-mono mt-2')
                             chat_resp_area = ui.markdown('').classes('w-full p-4 bg-gray-900 border-l-4 border-blue-500 text-blue-100 rounded text-sm hidden min-h-[100px]')
 
@@ -831,10 +1126,11 @@ async def main_page():
                                 with ui.card().classes('bg-blue-50 border-blue-100 p-4 w-full'):
                                     ui.label('Step 2: Search Test. Query your data. Finds relevant chunks from the selected workspace.').classes('text-xs text-blue-800')
                                 with ui.row().classes('w-full gap-2 items-end'):
-                                    search_query = ui.input(label='Search Question', value='What is RealtimeX?').classes('flex-1')
+                                    search_query = ui.input(label='Search Question', value='What is RealtimeX?', on_change=prefetch_query_embedding).classes('flex-1')
                                     search_doc_id = ui.input(label='Doc ID Filter').classes('w-32')
                                     search_top_k = ui.number(label='Top K', value=3).classes('w-16')
                                     ui.button('SEARCH', icon='search', on_click=semantic_search).props('color=blue px-6')
+                                    ui.button('ANSWER', icon='question_answer', on_click=rag_answer).props('color=green px-6').tooltip('Search and stream a grounded answer with the selected chat model')
                             
                             with ui.tab_panel(vt3).classes('p-0'):
                                 with ui.card().classes('bg-indigo-50 border-indigo-100 p-4 w-full mb-4'):
@@ -896,7 +1192,20 @@ async def main_page():
                         with ui.card().classes('flex-1'):
                             ui.label('Tests').classes('text-md font-bold text-blue-600 mb-2')
                             ui.button('🎤 Start Listening', on_click=stt_listen).props('color=red size=lg').classes('w-full h-16')
+                            with ui.row().classes('w-full gap-2 items-end mt-2'):
+                                stt_continuous_button = ui.button('🔁 Continuous', on_click=toggle_continuous_stt).props('color=orange').classes('flex-1')
+                                stt_segment_input = ui.number(label='Segment (ms)', value=4000, min=1000, max=15000, step=500).classes('w-28')
                             stt_status_label = ui.label('Ready to listen').classes('text-md text-gray-500 mt-4 text-center w-full block')
+                            stt_transcript_area = ui.markdown('').classes('w-full p-4 bg-slate-50 border rounded text-sm hidden mt-2 max-h-60 overflow-auto')
+
+                    with ui.card().classes('w-full'):
+                        ui.label('🗣 Voice Assistant').classes('text-md font-bold text-blue-600 mb-2')
+                        ui.label('Speech → streaming chat → streaming TTS. Uses the Chat Model (LLM tab), the TTS settings and the STT provider above. Speaking over a reply cancels it (barge-in). With speakers the microphone hears the reply itself, so barge-in needs headphones; without it, speech during playback is ignored.').classes('text-xs text-gray-500 mb-2')
+                        voice_barge_in_switch = ui.switch('Barge-in (headphones)', value=False)
+                        voice_button = ui.button('🗣 Start Voice Assistant', on_click=toggle_voice_assistant).props('color=indigo').classes('w-full')
+                        voice_status_label = ui.label('Idle').classes('text-sm text-gray-500 mt-2')
+                        voice_latency_label = ui.label('').classes('text-xs font-mono text-gray-400')
+                        voice_resp_area = ui.markdown('').classes('w-full p-4 bg-gray-900 border-l-4 border-indigo-500 text-indigo-100 rounded text-sm hidden mt-2')
 
 
         with ui.column().classes('w-80'):
@@ -905,16 +1214,38 @@ async def main_page():
                     ui.label('SDK Output').classes('text-xs font-bold text-slate-400')
                     ui.button(icon='delete_sweep', on_click=lambda: (state.logs.clear(), log_area.set_content(""))).props('flat round size=xs color=slate-400')
                 log_area = ui.html('', sanitize=False).classes('text-[10px] font-mono leading-tight whitespace-pre-wrap overflow-auto h-[70vh]')
+                with ui.expansion('Capacity (in flight / limit, queue wait vs service)', icon='speed').classes('w-full text-xs text-slate-400'):
+                    capacity_area = ui.label('').classes('text-[10px] font-mono whitespace-pre text-slate-300')
+                ui.timer(2.0, refresh_capacity)
+                with ui.expansion('Profiling (loop lag, wall vs blocking vs CPU, offloaded payloads)', icon='insights').classes('w-full text-xs text-slate-400'):
+                    profiling_area = ui.label('').classes('text-[10px] font-mono whitespace-pre text-slate-300')
+                    with ui.row().classes('w-full items-center gap-1 no-wrap'):
+                        profile_actions_input = ui.number(label='Actions', value=5, min=1, max=100).classes('w-16').props('dense dark')
+                        profile_capture_button = ui.button('Capture', on_click=toggle_profile_capture).props('flat size=sm color=amber')
+                        profile_download_button = ui.button(icon='download', on_click=download_profile).props('flat round size=sm color=slate-300').tooltip('Download the last capture (zip)')
+                    profile_status_label = ui.label('').classes('text-[10px] text-slate-400')
+                ui.timer(2.0, refresh_profiling)
+
+    refresh_chat_sessions()
 
     # Initial diagnostics & load
     await asyncio.gather(
         refresh_system_status(),
-        refresh_activities(), 
+        # Other tabs already keep the shared feed loaded
+        refresh_activities() if not feed.loaded else asyncio.sleep(0),
         fetch_agents(), 
         fetch_workspaces(),
         fetch_vector_workspaces()
     )
 
+app.on_startup(lambda: activity_feed.get_feed().start())
+app.on_startup(lambda: profiling.get_monitor().start())
+profiling.get_monitor().subscribe(log_loop_lag)
+app.on_shutdown(activity_feed.get_feed().stop)
+app.on_shutdown(limits.close_http_pool)
+app.on_shutdown(profiling.get_monitor().stop)
+app.on_shutdown(offload.shutdown)
+
 if __name__ in {"__main__", "__mp_main__"}:
-    port = sdk.port.get_port()
+    port = services.get_port()
     ui.run(title='RealtimeX SDK Demo', port=port, show=False)
@@ -0,0 +1,143 @@
+"""
+Size-based offloading of CPU-heavy payload processing.
+
+NiceGUI serves every client from one event loop, so base64-encoding a
+multi-megabyte WAV buffer inline freezes all connected dashboards.
+`run(op, fn, *args, size=...)` runs `fn` inline when the payload is
+small, where a pool round trip would cost more than the work itself, and
+in the operation's executor when `size` reaches its threshold.
+
+Only work that can actually leave the interpreter belongs here. Base64
+of audio runs in a process pool: bytes in and one str out are cheap to
+transfer, and the encoding no longer holds the UI's GIL. If the process
+pool breaks, the call falls back to a thread. Parsing large JSON gains
+nothing from either pool. `json.loads` holds the GIL in a thread, and
+with a process the result's object graph must be unpickled in this
+interpreter, which holds the GIL just as long. Large pasted JSON is
+therefore still parsed inline.
+
+Per operation, `stats()` reports inline and offloaded call counts,
+loop-blocking time (the whole call when inline, just the dispatch when
+offloaded) and offloaded time (submit to result, including queueing).
+
+Configuration (environment):
+    RTX_OFFLOAD=0                       run everything inline
+    RTX_OFFLOAD_THREADS                 thread pool size (default: 4)
+    RTX_OFFLOAD_PROCESSES               process pool size (default: 2)
+    RTX_OFFLOAD_AUDIO_BASE64_MIN        bytes (default: 262144)
+"""
+import asyncio
+import functools
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Dict, Any, Callable
+
+@dataclass
+class Operation:
+    threshold: int
+    pool: str = 'thread'  # 'thread' or 'process'
+
+# Thresholds are in the unit of `size` passed by the caller
+OPERATIONS = {
+    'audio.base64': Operation(threshold=256 * 1024, pool='process'),
+}
+# Operations without an entry above
+DEFAULT_THRESHOLD = 64 * 1024
+
+@dataclass
+class OffloadStats:
+    inline: int = 0
+    offloaded: int = 0
+    blocking_total: float = 0.0
+    blocking_max: float = 0.0
+    offload_total: float = 0.0
+    offload_max: float = 0.0
+    size_max: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        calls = self.inline + self.offloaded
+        return {
+            'calls': calls,
+            'inline': self.inline,
+            'offloaded': self.offloaded,
+            'blocking_avg_ms': round(self.blocking_total / (calls or 1) * 1000, 2),
+            'blocking_max_ms': round(self.blocking_max * 1000, 2),
+            'offload_avg_ms': round(self.offload_total / (self.offloaded or 1) * 1000, 1),
+            'offload_max_ms': round(self.offload_max * 1000, 1),
+            'size_max': self.size_max,
+        }
+
+_stats: Dict[str, OffloadStats] = {}
+_executors: Dict[str, Executor] = {}
+
+def _operation(op: str) -> Operation:
+    if op not in OPERATIONS:
+        OPERATIONS[op] = Operation(threshold=DEFAULT_THRESHOLD)
+    operation = OPERATIONS[op]
+    env = f"RTX_OFFLOAD_{op.replace('.', '_').upper()}_MIN"
+    if env in os.environ:
+        operation.threshold = int(os.environ[env])
+    return operation
+
+def _executor(pool: str) -> Executor:
+    if pool not in _executors:
+        if pool == 'process':
+            _executors[pool] = ProcessPoolExecutor(max_workers=int(os.environ.get('RTX_OFFLOAD_PROCESSES', 2)))
+        else:
+            _executors[pool] = ThreadPoolExecutor(
+                max_workers=int(os.environ.get('RTX_OFFLOAD_THREADS', 4)), thread_name_prefix='offload'
+            )
+    return _executors[pool]
+
+def _record_blocking(stats: OffloadStats, blocked: float):
+    stats.blocking_total += blocked
+    stats.blocking_max = max(stats.blocking_max, blocked)
+
+async def run(op: str, fn: Callable, *args, size: int) -> Any:
+    """Run `fn(*args)` inline or in the operation's pool, depending on `size`.
+
+    Process-pool operations need a picklable, module-level `fn`.
+    """
+    operation = _operation(op)
+    stats = _stats.setdefault(op, OffloadStats())
+    stats.size_max = max(stats.size_max, size)
+
+    if size < operation.threshold or os.environ.get('RTX_OFFLOAD') == '0':
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stats.inline += 1
+            _record_blocking(stats, time.perf_counter() - started)
+
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args)
+    stats.offloaded += 1
+    started = time.perf_counter()
+    try:
+        try:
+            future = loop.run_in_executor(_executor(operation.pool), call)
+        finally:
+            _record_blocking(stats, time.perf_counter() - started)
+        return await future
+    except BrokenProcessPool:
+        # A crashed worker poisons the whole pool; replace it and finish on a thread
+        broken = _executors.pop('process', None)
+        if broken:
+            broken.shutdown(wait=False)
+        return await loop.run_in_executor(_executor('thread'), call)
+    finally:
+        elapsed = time.perf_counter() - started
+        stats.offload_total += elapsed
+        stats.offload_max = max(stats.offload_max, elapsed)
+
+def stats() -> Dict[str, Dict[str, Any]]:
+    return {op: s.as_dict() for op, s in _stats.items()}
+
+def shutdown():
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
@@ -0,0 +1,384 @@
+"""
+On-demand profiling for the dashboard's single event loop.
+
+Three tools for telling loop-blocking work apart from remote latency:
+
+- `LoopLagMonitor` sleeps for a fixed interval and measures how late it
+  wakes up. Lag above the threshold means something held the loop, and
+  subscribers are alerted with the actions that were running at the time.
+- `action()` wraps UI handlers and records per-action wall time,
+  blocking time and CPU time. Blocking time is the wall-clock time the
+  handler's own coroutine held the loop, measured per step, so it
+  includes synchronous I/O (SQLite commits, file writes) as well as
+  computation. CPU time covers the same steps and shows how much of that
+  was computation. Wall minus blocking is time spent waiting (remote
+  calls, queues).
+- `ProfileCapture` arms cProfile and tracemalloc for the next N
+  top-level actions. The report (pstats text, allocation diff and the raw
+  `.prof`) is written as one zip file for download.
+
+Configuration (environment):
+    RTX_LOOP_LAG_INTERVAL_MS    sampling interval (default: 100)
+    RTX_LOOP_LAG_THRESHOLD_MS   alert threshold (default: 200)
+    RTX_LOOP_LAG_COOLDOWN       seconds between alerts (default: 5)
+    RTX_PROFILE_DIR             capture output (default: storage/profiles)
+"""
+import asyncio
+import contextvars
+import cProfile
+import functools
+import io
+import os
+import pstats
+import time
+import tracemalloc
+import zipfile
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Callable
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'storage', 'profiles')
+REPORT_LINES = 40
+
+# --- Per-action Wall / CPU Attribution ---
+
+@dataclass
+class ActionStats:
+    calls: int = 0
+    errors: int = 0
+    wall_total: float = 0.0
+    wall_max: float = 0.0
+    blocked_total: float = 0.0
+    blocked_max: float = 0.0
+    cpu_total: float = 0.0
+    cpu_max: float = 0.0
+    # Longest single run of the handler without yielding to the loop
+    step_max: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        n = self.calls or 1
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'wall_avg_ms': round(self.wall_total / n * 1000, 1),
+            'wall_max_ms': round(self.wall_max * 1000, 1),
+            'blocked_avg_ms': round(self.blocked_total / n * 1000, 1),
+            'blocked_max_ms': round(self.blocked_max * 1000, 1),
+            'cpu_avg_ms': round(self.cpu_total / n * 1000, 1),
+            'cpu_max_ms': round(self.cpu_max * 1000, 1),
+            'blocked_share': round(self.blocked_total / self.wall_total, 3) if self.wall_total else 0.0,
+            'step_max_ms': round(self.step_max * 1000, 1),
+        }
+
+_stats: Dict[str, ActionStats] = {}
+# Actions currently running, for lag alerts
+_active: Counter = Counter()
+# Set while an action runs, so nested actions don't count as top-level
+_current_action: contextvars.ContextVar = contextvars.ContextVar('current_action', default=None)
+
+class _Timed:
+    """Drive a coroutine step by step, charging the time each step holds
+    the loop (wall clock) and its CPU time to it."""
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.blocked = 0.0
+        self.cpu = 0.0
+        self.step_max = 0.0
+
+    def __await__(self):
+        send, error = None, None
+        while True:
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            try:
+                if error is not None:
+                    yielded = self.coro.throw(error)
+                else:
+                    yielded = self.coro.send(send)
+            except StopIteration as stop:
+                return stop.value
+            finally:
+                step = time.perf_counter() - started
+                self.blocked += step
+                self.cpu += time.thread_time() - cpu_started
+                self.step_max = max(self.step_max, step)
+            try:
+                send, error = (yield yielded), None
+            except BaseException as e:
+                send, error = None, e
+
+def _record(name: str, wall: float, blocked: float, cpu: float, step_max: float, failed: bool):
+    stats = _stats.setdefault(name, ActionStats())
+    stats.calls += 1
+    stats.errors += failed
+    stats.wall_total += wall
+    stats.wall_max = max(stats.wall_max, wall)
+    stats.blocked_total += blocked
+    stats.blocked_max = max(stats.blocked_max, blocked)
+    stats.cpu_total += cpu
+    stats.cpu_max = max(stats.cpu_max, cpu)
+    stats.step_max = max(stats.step_max, step_max)
+
+def action(fn: Callable) -> Callable:
+    """Decorator for UI handlers (sync or async): time each call under the
+    function's name and feed the profile capture."""
+    name = fn.__name__
+
+    def begin():
+        top_level = _current_action.get() is None
+        token = _current_action.set(name)
+        _active[name] += 1
+        if top_level:
+            get_capture().action_started()
+        return top_level, token
+
+    def end(top_level, token, wall, blocked, cpu, step_max, failed):
+        _active[name] -= 1
+        if not _active[name]:
+            del _active[name]
+        _current_action.reset(token)
+        _record(name, wall, blocked, cpu, step_max, failed)
+        if top_level:
+            get_capture().action_finished()
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            top_level, token = begin()
+            timed = _Timed(fn(*args, **kwargs))
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await timed
+            except Exception:
+                failed = True
+                raise
+            finally:
+                end(top_level, token, time.perf_counter() - started, timed.blocked, timed.cpu, timed.step_max, failed)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            top_level, token = begin()
+            started, cpu_started = time.perf_counter(), time.thread_time()
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                # A synchronous handler holds the loop for its whole run
+                wall = time.perf_counter() - started
+                end(top_level, token, wall, wall, time.thread_time() - cpu_started, wall, failed)
+    return wrapper
+
+def action_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: s.as_dict() for name, s in _stats.items()}
+
+def active_actions() -> List[str]:
+    return sorted(_active)
+
+def reset_action_stats():
+    _stats.clear()
+
+# --- Event Loop Lag ---
+
+@dataclass
+class LagStats:
+    samples: int = 0
+    alerts: int = 0
+    lag_last: float = 0.0
+    lag_max: float = 0.0
+    lag_total: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'samples': self.samples,
+            'alerts': self.alerts,
+            'lag_last_ms': round(self.lag_last * 1000, 1),
+            'lag_avg_ms': round(self.lag_total / (self.samples or 1) * 1000, 1),
+            'lag_max_ms': round(self.lag_max * 1000, 1),
+        }
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, threshold: float = 0.2, cooldown: float = 5.0):
+        self.interval = interval
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.stats = LagStats()
+        self._last_alert = 0.0
+        self._subscribers: List[Callable[[float, List[str]], None]] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, callback: Callable[[float, List[str]], None]) -> Callable[[], None]:
+        """Register `callback(lag_seconds, active_actions)`; returns an unsubscribe function."""
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+        return unsubscribe
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self._record(lag)
+
+    def _record(self, lag: float):
+        self.stats.samples += 1
+        self.stats.lag_last = lag
+        self.stats.lag_total += lag
+        self.stats.lag_max = max(self.stats.lag_max, lag)
+        now = time.monotonic()
+        if lag < self.threshold or now - self._last_alert < self.cooldown:
+            return
+        self._last_alert = now
+        self.stats.alerts += 1
+        # Actions still running when the sampler wakes up are the likely culprits
+        active = active_actions()
+        for callback in list(self._subscribers):
+            try:
+                callback(lag, active)
+            except Exception:
+                pass
+
+_monitor: Optional[LoopLagMonitor] = None
+
+def get_monitor() -> LoopLagMonitor:
+    global _monitor
+    if _monitor is None:
+        _monitor = LoopLagMonitor(
+            interval=float(os.environ.get('RTX_LOOP_LAG_INTERVAL_MS', 100)) / 1000,
+            threshold=float(os.environ.get('RTX_LOOP_LAG_THRESHOLD_MS', 200)) / 1000,
+            cooldown=float(os.environ.get('RTX_LOOP_LAG_COOLDOWN', 5))
+        )
+    return _monitor
+
+# --- cProfile / tracemalloc Capture ---
+
+class ProfileCapture:
+    """Profile the loop thread from the start of the next top-level action
+    until N top-level actions have finished."""
+
+    def __init__(self, directory: str = DEFAULT_DIR):
+        self.directory = directory
+        self.remaining = 0
+        self.actions = 0
+        self.last_path: Optional[str] = None
+        self.error: Optional[str] = None
+        self._profiler: Optional[cProfile.Profile] = None
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._started_at = 0.0
+        self._on_done: List[Callable[[str], None]] = []
+
+    @property
+    def armed(self) -> bool:
+        return self.remaining > 0
+
+    @property
+    def running(self) -> bool:
+        return self._profiler is not None
+
+    def arm(self, actions: int, on_done: Optional[Callable[[str], None]] = None):
+        self.remaining = max(1, actions)
+        self.actions = 0
+        self.error = None
+        if on_done:
+            self._on_done.append(on_done)
+
+    def cancel(self):
+        self.remaining = 0
+        self._on_done.clear()
+        if self.running:
+            self._profiler.disable()
+            self._profiler = None
+            tracemalloc.stop()
+            self._baseline = None
+
+    def action_started(self):
+        if not self.armed or self.running:
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) already owns the thread
+            self.error = str(e)
+            self.remaining = 0
+            return
+        self._profiler = profiler
+        self._started_at = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+        self._baseline = tracemalloc.take_snapshot()
+
+    def action_finished(self):
+        if not self.running:
+            return
+        self.actions += 1
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self._finish()
+
+    def _finish(self):
+        self._profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        elapsed = time.perf_counter() - self._started_at
+
+        stream = io.StringIO()
+        stream.write(f"Profile of {self.actions} action(s) over {elapsed:.2f}s\n\n")
+        for sort in ('cumulative', 'tottime'):
+            stream.write(f"=== cProfile by {sort} ===\n")
+            pstats.Stats(self._profiler, stream=stream).sort_stats(sort).print_stats(REPORT_LINES)
+        stream.write("=== tracemalloc: allocation growth by line ===\n")
+        for stat in snapshot.compare_to(self._baseline, 'lineno')[:REPORT_LINES]:
+            stream.write(f"{stat}\n")
+
+        self.last_path = self._write(stream.getvalue())
+        self._profiler = None
+        self._baseline = None
+        callbacks, self._on_done = self._on_done, []
+        for callback in callbacks:
+            try:
+                callback(self.last_path)
+            except Exception:
+                pass
+
+    def _write(self, report: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        path = os.path.join(self.directory, f"profile-{stamp}.zip")
+        prof_path = os.path.join(self.directory, f"profile-{stamp}.prof")
+        self._profiler.dump_stats(prof_path)
+        try:
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('report.txt', report)
+                zf.write(prof_path, 'actions.prof')
+        finally:
+            os.remove(prof_path)
+        return path
+
+_capture: Optional[ProfileCapture] = None
+
+def get_capture() -> ProfileCapture:
+    global _capture
+    if _capture is None:
+        _capture = ProfileCapture(os.environ.get('RTX_PROFILE_DIR', DEFAULT_DIR))
+    return _capture
@@ -0,0 +1,147 @@
+"""
+Pipelined RAG answers: embed -> vector search -> streaming chat.
+
+The query embedding can be prefetched while the user is still typing
+(debounced), so by the time the question is submitted the embed stage is
+usually already done. Generation starts as soon as the top-k context is
+assembled, and each stage is timed.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Tuple
+
+import services
+
+RAG_SYSTEM_PROMPT = (
+    "Answer the question using only the context below. If the context does "
+    "not contain the answer, say so.\n\nContext:\n{context}"
+)
+
+@dataclass
+class RagTimings:
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+    first_token_ms: Optional[float] = None
+    total_ms: float = 0.0
+    # embed_ms is the embed request's own duration, even when it ran ahead
+    embed_prefetched: bool = False
+
+    def summary(self) -> str:
+        first = f"{self.first_token_ms:.0f}ms" if self.first_token_ms is not None else "-"
+        embed = f"{self.embed_ms:.0f}ms" + (" (prefetched)" if self.embed_prefetched else "")
+        return f"embed {embed} | search {self.search_ms:.0f}ms | first token {first} | complete {self.total_ms:.0f}ms"
+
+@dataclass
+class QueryEmbedding:
+    vector: List[float]
+    # Model the hub resolved, which the vector query must match
+    model: Optional[str]
+    embed_ms: float
+
+class EmbeddingPrefetcher:
+    """Debounced, de-duplicated query embeddings keyed by (text, provider, model)."""
+
+    def __init__(self, debounce: float = 0.3, max_entries: int = 16):
+        self.debounce = debounce
+        self.max_entries = max_entries
+        self._tasks: 'OrderedDict[Tuple, asyncio.Task]' = OrderedDict()
+        self._pending: Optional[asyncio.Task] = None
+
+    def prefetch(self, text: str, provider: Optional[str] = None, model: Optional[str] = None):
+        """Schedule an embedding after the debounce delay; newer keystrokes cancel older ones."""
+        text = text.strip()
+        if not text or (text, provider, model) in self._tasks:
+            return
+        if self._pending and not self._pending.done():
+            self._pending.cancel()
+
+        async def delayed():
+            await asyncio.sleep(self.debounce)
+            self._start(text, provider, model)
+
+        self._pending = asyncio.ensure_future(delayed())
+
+    def is_ready(self, text: str, provider: Optional[str] = None, model: Optional[str] = None) -> bool:
+        task = self._tasks.get((text.strip(), provider, model))
+        return task is not None and task.done() and not task.cancelled() and task.exception() is None
+
+    async def get(self, text: str, provider: Optional[str] = None, model: Optional[str] = None) -> QueryEmbedding:
+        """Embedding for `text`, reusing a prefetched or in-flight request."""
+        key = (text.strip(), provider, model)
+        task = self._tasks.get(key)
+        if task is None or task.cancelled() or (task.done() and task.exception() is not None):
+            task = self._start(*key)
+        self._tasks.move_to_end(key)
+        return await asyncio.shield(task)
+
+    def _start(self, text: str, provider: Optional[str], model: Optional[str]) -> asyncio.Task:
+        async def run():
+            started = time.perf_counter()
+            res = await services.embed(text, provider=provider, model=model)
+            vec = res.get('embeddings', [[]])[0]
+            if not vec:
+                raise ValueError("Failed to embed query")
+            return QueryEmbedding(vec, res.get('model'), (time.perf_counter() - started) * 1000)
+
+        task = asyncio.ensure_future(run())
+        # Failed prefetches are retried by get(); don't warn about them
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._tasks[(text, provider, model)] = task
+        while len(self._tasks) > self.max_entries:
+            self._tasks.popitem(last=False)
+        return task
+
+def build_messages(question: str, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    context = "\n\n".join(
+        f"[{i+1}] {m.get('metadata', {}).get('text', m.get('id', ''))}" for i, m in enumerate(matches)
+    )
+    return [
+        {'role': 'system', 'content': RAG_SYSTEM_PROMPT.format(context=context)},
+        {'role': 'user', 'content': question},
+    ]
+
+async def answer_stream(
+    question: str,
+    prefetcher: EmbeddingPrefetcher,
+    timings: RagTimings,
+    top_k: int = 3,
+    workspace_id: Optional[str] = None,
+    document_id: Optional[str] = None,
+    embed_provider: Optional[str] = None,
+    embed_model: Optional[str] = None,
+    chat_provider: Optional[str] = None,
+    chat_model: Optional[str] = None,
+    on_matches: Optional[Callable[[List[Dict[str, Any]]], None]] = None
+) -> AsyncIterator[str]:
+    """Stream an answer grounded in the top-k matches; fills `timings` as stages finish."""
+    start = time.perf_counter()
+
+    timings.embed_prefetched = prefetcher.is_ready(question, embed_provider, embed_model)
+    embedding = await prefetcher.get(question, embed_provider, embed_model)
+    embedded = time.perf_counter()
+    timings.embed_ms = embedding.embed_ms
+
+    matches = await services.vector_query(
+        embedding.vector,
+        top_k=top_k,
+        workspace_id=workspace_id,
+        document_id=document_id,
+        # As in `search`: the selected model, else the one the hub embedded with
+        model=embed_model or embedding.model
+    )
+    searched = time.perf_counter()
+    timings.search_ms = (searched - embedded) * 1000
+    if on_matches:
+        on_matches(matches)
+
+    async for text in services.chat_stream(
+        build_messages(question, matches),
+        provider=chat_provider,
+        model=chat_model
+    ):
+        if timings.first_token_ms is None:
+            timings.first_token_ms = (time.perf_counter() - start) * 1000
+        yield text
+    timings.total_ms = (time.perf_counter() - start) * 1000
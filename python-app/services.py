@@ -0,0 +1,658 @@
+"""
+Service layer for the RealtimeX demo.
+
+All SDK actions live here as plain async functions that take explicit
+arguments and return data (or raise). Nothing in this module imports
+NiceGUI, so it can be shared by the UI (`main.py`) and the headless
+worker (`worker.py`).
+"""
+import asyncio
+import base64
+import os
+import uuid
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator, Callable
+
+import chat_cache
+import chat_sessions
+import embed_tuner
+import limits
+import offload
+
+# Permissions requested from RealtimeX on registration
+PERMISSIONS = [
+    # Activities
+    'activities.read',
+    'activities.write',
+    # API
+    'api.agents',
+    'api.workspaces',
+    'api.threads',
+    'api.task',
+    # Webhook
+    'webhook.trigger',
+    # LLM
+    'llm.chat',
+    'llm.embed',
+    'llm.providers',
+    # Vectors
+    'vectors.read',
+    'vectors.write',
+    # TTS
+    'tts.generate',
+    # STT
+    'stt.listen'
+]
+
+_sdk = None
+
+def get_sdk():
+    """Return the process-wide SDK client, creating it on first use."""
+    global _sdk
+    if _sdk is None:
+        from realtimex_sdk import RealtimeXSDK, SDKConfig
+        _sdk = RealtimeXSDK(config=SDKConfig(permissions=PERMISSIONS))
+        if os.environ.get('RTX_HTTP_POOL', '').lower() in ('1', 'true', 'yes', 'on'):
+            limits.install_http_pool(_sdk.realtimex_url)
+    return _sdk
+
+def capacity_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-capability concurrency, queue wait and service time."""
+    return limits.get_limiter().snapshot()
+
+def split_model(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Split a "provider/model" selector value into its parts."""
+    if not value:
+        return None, None
+    provider, model = value.split('/', 1)
+    return provider, model
+
+def describe_error(e: Exception) -> str:
+    """Human readable message for SDK errors (LLM errors carry extra detail)."""
+    from realtimex_sdk import LLMProviderError, LLMPermissionError
+    if isinstance(e, LLMPermissionError):
+        return f"Permission Required: {e.permission}"
+    if isinstance(e, LLMProviderError):
+        return f"Provider Error: {e.message} (Code: {e.code})"
+    return f"Error: {e}"
+
+# --- System ---
+
+async def register():
+    await get_sdk().register()
+
+async def system_status() -> Dict[str, Any]:
+    sdk = get_sdk()
+    return {
+        'ping': await sdk.ping(),
+        'data_dir': await sdk.get_app_data_dir(),
+    }
+
+def get_port() -> int:
+    return get_sdk().port.get_port()
+
+# --- Activities ---
+
+def decorate_activity(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        **r,
+        'display_type': r.get('raw_data', {}).get('type', 'N/A'),
+        'display_time': r.get('created_at', '')[:19].replace('T', ' ')
+    }
+
+async def list_activities(limit: int = 20, status: Optional[str] = None) -> List[Dict[str, Any]]:
+    kwargs = {'limit': limit}
+    if status:
+        kwargs['status'] = status
+    async with limits.slot('activities'):
+        raw_activities = await get_sdk().activities.list(**kwargs)
+    return [decorate_activity(r) for r in raw_activities]
+
+async def create_activity(data: Dict[str, Any]) -> Dict[str, Any]:
+    async with limits.slot('activities'):
+        return await get_sdk().activities.insert(data)
+
+async def update_activity(id: str, status: str) -> Dict[str, Any]:
+    async with limits.slot('activities'):
+        return await get_sdk().activities.update(id, {"status": status})
+
+async def delete_activity(id: str):
+    async with limits.slot('activities'):
+        await get_sdk().activities.delete(id)
+
+# --- API & Webhook ---
+
+async def list_agents() -> List[Dict[str, Any]]:
+    async with limits.slot('api'):
+        return await get_sdk().api.get_agents()
+
+async def list_workspaces() -> List[Dict[str, Any]]:
+    async with limits.slot('api'):
+        return await get_sdk().api.get_workspaces()
+
+async def list_threads(workspace_slug: str) -> List[Dict[str, Any]]:
+    async with limits.slot('api'):
+        return await get_sdk().api.get_threads(workspace_slug)
+
+async def trigger_agent(
+    raw_data: Dict[str, Any],
+    auto_run: bool,
+    prompt: str,
+    agent_name: Optional[str] = None,
+    workspace_slug: Optional[str] = None,
+    thread_slug: Optional[str] = None
+) -> Dict[str, Any]:
+    async with limits.slot('api'):
+        return await get_sdk().webhook.trigger_agent(
+            raw_data=raw_data,
+            auto_run=auto_run,
+            prompt=prompt,
+            agent_name=agent_name if auto_run else None,
+            workspace_slug=workspace_slug if auto_run else None,
+            thread_slug=thread_slug if auto_run and thread_slug != 'create_new' else None
+        )
+
+async def get_task(uuid: str) -> Dict[str, Any]:
+    async with limits.slot('api'):
+        return await get_sdk().api.get_task(uuid)
+
+async def start_task(uuid: str):
+    async with limits.slot('api'):
+        await get_sdk().task.start(uuid)
+
+async def complete_task(uuid: str, result: Dict[str, Any]):
+    async with limits.slot('api'):
+        await get_sdk().task.complete(uuid, result=result)
+
+async def fail_task(uuid: str, error: str):
+    async with limits.slot('api'):
+        await get_sdk().task.fail(uuid, error=error)
+
+# --- LLM & Vectors ---
+
+def _model_options(providers: List[Dict[str, Any]]) -> Dict[str, str]:
+    opts = {}
+    for p in providers:
+        provider_name = p.get('provider')
+        for m in p.get('models', []):
+            opts[f"{provider_name}/{m['id']}"] = f"[{provider_name}] {m['id']}"
+    return opts
+
+async def list_providers() -> Dict[str, Any]:
+    """Chat and embedding providers plus ready-made select options."""
+    sdk = get_sdk()
+    async with limits.slot('api'):
+        chat_res = await sdk.llm.chat_providers()
+        embed_res = await sdk.llm.embed_providers()
+    providers = {
+        'llm': chat_res.get('providers', []),
+        'embedding': embed_res.get('providers', [])
+    }
+    return {
+        'providers': providers,
+        'chat_options': _model_options(providers['llm']),
+        'embed_options': _model_options(providers['embedding']),
+    }
+
+async def list_vector_workspaces() -> Optional[List[str]]:
+    async with limits.slot('vectors'):
+        res = await get_sdk().llm.vectors.list_workspaces()
+    if not res.success:
+        return None
+    workspaces = res.workspaces
+    if 'default' not in workspaces:
+        workspaces = ['default'] + workspaces
+    return workspaces
+
+# --- Chat Response Cache ---
+
+class _CacheLookup:
+    """Result of a cache probe; carries what is needed to store the answer on a miss."""
+    def __init__(self, key: str, scope: str, hit=None, embedding: Optional[List[float]] = None):
+        self.key = key
+        self.scope = scope
+        self.hit = hit
+        self.embedding = embedding
+
+async def _cache_lookup(messages, provider, model, response_format) -> _CacheLookup:
+    cache = chat_cache.get_cache()
+    lookup = _CacheLookup(
+        chat_cache.cache_key(messages, provider, model, response_format),
+        chat_cache.scope_key(provider, model, response_format)
+    )
+    lookup.hit = cache.get(lookup.key)
+    # With nothing to compare against, skip the embed call; the answer's
+    # embedding is then added in the background after it is stored
+    if lookup.hit is None and cache.config.semantic and cache.has_embeddings(lookup.scope):
+        lookup.embedding = await _prompt_embedding(messages)
+        if lookup.embedding:
+            lookup.hit = cache.get_similar(lookup.scope, lookup.embedding)
+    if lookup.hit is None:
+        cache.misses += 1
+    else:
+        cache.hits += 1
+    return lookup
+
+async def _prompt_embedding(messages) -> Optional[List[float]]:
+    # Semantic tier is best effort: an embedding failure just means a miss
+    e_provider, e_model = split_model(chat_cache.get_cache().config.embed_model)
+    try:
+        res = await embed(chat_cache.prompt_text(messages), provider=e_provider, model=e_model)
+        return res.get('embeddings', [[]])[0] or None
+    except Exception:
+        return None
+
+async def _embed_cached_prompt(lookup: _CacheLookup, messages):
+    embedding = await _prompt_embedding(messages)
+    if embedding:
+        chat_cache.get_cache().add_embedding(lookup.key, lookup.scope, embedding)
+
+def _cache_store(lookup: _CacheLookup, messages, content: str):
+    """Store a successful answer; empty or failed responses are never cached."""
+    if not content:
+        return
+    cache = chat_cache.get_cache()
+    cache.put(lookup.key, lookup.scope, content, lookup.embedding)
+    if cache.config.semantic and not lookup.embedding:
+        _spawn(_embed_cached_prompt(lookup, messages))
+
+def _use_cache(cache: Optional[bool]) -> bool:
+    return chat_cache.get_cache().config.enabled if cache is None else cache
+
+async def chat(
+    messages: List[Dict[str, Any]],
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    cache: Optional[bool] = None,
+    on_cache_hit: Optional[Callable[[chat_cache.CacheHit], None]] = None
+) -> str:
+    """Chat completion. `cache` overrides the RTX_CHAT_CACHE default."""
+    lookup = None
+    if _use_cache(cache):
+        lookup = await _cache_lookup(messages, provider, model, response_format)
+        if lookup.hit:
+            if on_cache_hit:
+                on_cache_hit(lookup.hit)
+            return lookup.hit.content
+
+    async with limits.slot('llm.chat'):
+        res = await get_sdk().llm.chat(
+            messages,
+            model=model,
+            provider=provider,
+            response_format=response_format
+        )
+    content = res.get('response', {}).get('content')
+    if lookup and res.get('success', True) is not False:
+        _cache_store(lookup, messages, content)
+    return content or 'No content'
+
+async def chat_stream(
+    messages: List[Dict[str, Any]],
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    cache: Optional[bool] = None,
+    on_cache_hit: Optional[Callable[[chat_cache.CacheHit], None]] = None
+) -> AsyncIterator[str]:
+    """Yield text deltas of a streaming chat completion.
+
+    Cache hits are replayed as a stream; a completed live stream is stored.
+    """
+    lookup = None
+    if _use_cache(cache):
+        lookup = await _cache_lookup(messages, provider, model, response_format)
+        if lookup.hit:
+            if on_cache_hit:
+                on_cache_hit(lookup.hit)
+            for piece in chat_cache.replay_chunks(lookup.hit.content):
+                yield piece
+            return
+
+    parts = []
+    async for chunk in limits.stream('llm.chat', lambda: get_sdk().llm.chat_stream(
+        messages,
+        model=model,
+        provider=provider,
+        response_format=response_format
+    )):
+        # The SDK now returns an object with textResponse property
+        text = getattr(chunk, 'textResponse', '') or getattr(chunk, 'text', '')
+        if text:
+            parts.append(text)
+            yield text
+    if lookup:
+        _cache_store(lookup, messages, ''.join(parts))
+
+# --- Chat Sessions ---
+
+_background_tasks = set()
+
+def _spawn(coro):
+    """Run a fire-and-forget coroutine, keeping a reference until it finishes."""
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def drain_background_tasks():
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
+
+def create_session(title: str = "New chat") -> chat_sessions.ChatSession:
+    return chat_sessions.get_store().create(title)
+
+def list_sessions() -> List[Dict[str, Any]]:
+    return chat_sessions.get_store().list()
+
+def _session_prepare(
+    session_id: str,
+    new_messages: List[Dict[str, Any]],
+    budget: Optional[int],
+    strategy: Optional[str]
+) -> Tuple[chat_sessions.ChatSession, chat_sessions.PrunedContext]:
+    store = chat_sessions.get_store()
+    session = store.get(session_id)
+    if session is None:
+        raise ValueError(f"Unknown chat session: {session_id}")
+    # History is only persisted once the reply arrives, so a failed call
+    # leaves the session unchanged and can simply be retried
+    pending = chat_sessions.ChatSession(
+        id=session.id,
+        title=session.title,
+        messages=chat_sessions.merge_messages(session.messages, new_messages),
+        summary=session.summary,
+        summarized_upto=session.summarized_upto
+    )
+    pruned = chat_sessions.fit_to_budget(
+        pending,
+        budget or chat_sessions.DEFAULT_BUDGET,
+        strategy or chat_sessions.DEFAULT_STRATEGY
+    )
+    return session, pruned
+
+async def _refresh_summary(session, dropped_messages, provider, model):
+    request = chat_sessions.summary_request(session, dropped_messages)
+    if request is None:
+        return
+    try:
+        summary = await chat(request, provider=provider, model=model, cache=False)
+    except Exception:
+        # Keep the previous summary; the next turn retries with the same backlog
+        return
+    chat_sessions.get_store().set_summary(session, summary, len(dropped_messages))
+
+def _session_finish(session, new_messages, pruned, content, provider, model, strategy):
+    chat_sessions.get_store().append(session, new_messages + [{'role': 'assistant', 'content': content}])
+    # Summarize turns that fell out of the window off the critical path,
+    # so the next turn can use the summary without waiting for it
+    if (strategy or chat_sessions.DEFAULT_STRATEGY) == 'summarize' and pruned.dropped_messages:
+        _spawn(_refresh_summary(session, pruned.dropped_messages, provider, model))
+
+async def session_chat(
+    session_id: str,
+    new_messages: List[Dict[str, Any]],
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    budget: Optional[int] = None,
+    strategy: Optional[str] = None,
+    cache: Optional[bool] = None,
+    on_cache_hit: Optional[Callable[[chat_cache.CacheHit], None]] = None,
+    on_context: Optional[Callable[[chat_sessions.PrunedContext], None]] = None
+) -> str:
+    """Append `new_messages` to a session and answer with a budget-fitted context."""
+    session, pruned = _session_prepare(session_id, new_messages, budget, strategy)
+    if on_context:
+        on_context(pruned)
+    content = await chat(pruned.messages, provider=provider, model=model, response_format=response_format,
+                         cache=cache, on_cache_hit=on_cache_hit)
+    _session_finish(session, new_messages, pruned, content, provider, model, strategy)
+    return content
+
+async def session_chat_stream(
+    session_id: str,
+    new_messages: List[Dict[str, Any]],
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    budget: Optional[int] = None,
+    strategy: Optional[str] = None,
+    cache: Optional[bool] = None,
+    on_cache_hit: Optional[Callable[[chat_cache.CacheHit], None]] = None,
+    on_context: Optional[Callable[[chat_sessions.PrunedContext], None]] = None
+) -> AsyncIterator[str]:
+    """Streaming variant of `session_chat`."""
+    session, pruned = _session_prepare(session_id, new_messages, budget, strategy)
+    if on_context:
+        on_context(pruned)
+    parts = []
+    async for text in chat_stream(pruned.messages, provider=provider, model=model, response_format=response_format,
+                                  cache=cache, on_cache_hit=on_cache_hit):
+        parts.append(text)
+        yield text
+    _session_finish(session, new_messages, pruned, ''.join(parts), provider, model, strategy)
+
+async def embed(text, provider: Optional[str] = None, model: Optional[str] = None) -> Dict[str, Any]:
+    async with limits.slot('llm.embed'):
+        return await get_sdk().llm.embed(text, provider=provider, model=model)
+
+async def embed_and_store(
+    texts: List[str],
+    document_id: Optional[str] = None,
+    workspace_id: Optional[str] = None,
+    provider: Optional[str] = None,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """Embed and store `texts` using the tuned batch size and concurrency
+    for this provider/model.
+
+    Returns how many texts were stored and failed, with one error per
+    failed batch.
+    """
+    # Untuned models keep the original single-call behaviour
+    settings = embed_tuner.get_store().get(provider, model) or embed_tuner.TunedSettings(
+        batch_size=max(1, len(texts)), concurrency=1
+    )
+    sem = asyncio.Semaphore(settings.concurrency)
+    # The SDK's default vector ids only carry 4 random characters per call;
+    # give every batch of this run its own prefix so ids cannot collide
+    run_id = uuid.uuid4().hex[:12]
+
+    async def store(index, batch):
+        async with sem, limits.slot('llm.embed'):
+            return await get_sdk().llm.embed_and_store(
+                list(batch),
+                document_id=document_id,
+                workspace_id=workspace_id,
+                id_prefix=f"chunk_{run_id}_{index}",
+                provider=provider,
+                model=model
+            )
+
+    batches = list(embed_tuner.batches(texts, settings.batch_size))
+    responses = await asyncio.gather(*(store(i, b) for i, b in enumerate(batches)))
+    result = {'stored': 0, 'failed': 0, 'errors': []}
+    for batch, res in zip(batches, responses):
+        if res.success:
+            result['stored'] += len(batch)
+        else:
+            result['failed'] += len(batch)
+            result['errors'].append(res.error or "Embedding failed")
+    return result
+
+async def embed_many(
+    texts: List[str],
+    provider: Optional[str] = None,
+    model: Optional[str] = None
+) -> List[List[float]]:
+    """Embeddings for many texts, batched with the tuned settings."""
+    settings = embed_tuner.get_store().settings_for(provider, model)
+    sem = asyncio.Semaphore(settings.concurrency)
+
+    async def run(batch):
+        async with sem:
+            res = await embed(list(batch), provider=provider, model=model)
+        vectors = res.get('embeddings') or []
+        if len(vectors) != len(batch):
+            from realtimex_sdk import LLMProviderError
+            raise LLMProviderError(res.get('error') or "Embedding failed")
+        return vectors
+
+    results = await asyncio.gather(*(run(b) for b in embed_tuner.batches(texts, settings.batch_size)))
+    return [vec for batch in results for vec in batch]
+
+async def autotune_embeddings(
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    sample_texts: Optional[List[str]] = None,
+    on_probe: Optional[Callable[[embed_tuner.Probe], None]] = None
+) -> Optional[embed_tuner.TunedSettings]:
+    """Probe batch size / concurrency for a model and save the best setting."""
+    # Probing beyond the embed slot limit would only measure queueing
+    max_concurrency = limits.get_limiter().stats['llm.embed'].limit
+    settings = await embed_tuner.autotune(
+        lambda batch: embed(batch, provider=provider, model=model),
+        sample_texts=sample_texts,
+        concurrencies=[c for c in embed_tuner.CONCURRENCIES if c <= max_concurrency] or [1],
+        on_probe=on_probe
+    )
+    if settings:
+        embed_tuner.get_store().save(provider, model, settings)
+    return settings
+
+async def search(
+    query: str,
+    top_k: int = 3,
+    workspace_id: Optional[str] = None,
+    document_id: Optional[str] = None,
+    provider: Optional[str] = None,
+    model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    async with limits.slot('llm.embed'):
+        return await get_sdk().llm.search(
+            query,
+            top_k=top_k,
+            workspace_id=workspace_id,
+            document_id=document_id,
+            provider=provider,
+            model=model
+        )
+
+async def vector_query(
+    vector: List[float],
+    top_k: int = 3,
+    workspace_id: Optional[str] = None,
+    document_id: Optional[str] = None,
+    model: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Search with a precomputed query embedding (the second half of `search`).
+
+    Pass the model the embedding was made with (the embed response's
+    `model` when none was selected), as `search` does.
+    """
+    from realtimex_sdk import LLMProviderError
+    async with limits.slot('vectors'):
+        res = await get_sdk().llm.vectors.query(
+            vector=vector,
+            top_k=top_k,
+            workspace_id=workspace_id,
+            document_id=document_id,
+            model=model
+        )
+    if not res.success:
+        raise LLMProviderError(res.error or "Vector search failed")
+    return res.results
+
+def format_search_results(res: List[Dict[str, Any]]) -> str:
+    if not res:
+        return "*No results found*"
+    return "".join(
+        f"**Match #{i+1}** (Score: {r['score']:.3f})\n"
+        f"> {r.get('metadata', {}).get('text', r['id'])[:200]}\n\n"
+        for i, r in enumerate(res)
+    )
+
+async def delete_all_vectors(workspace_id: Optional[str] = None):
+    async with limits.slot('vectors'):
+        return await get_sdk().llm.vectors.delete(delete_all=True, workspace_id=workspace_id)
+
+# --- TTS ---
+
+async def list_tts_providers() -> List[Dict[str, Any]]:
+    async with limits.slot('api'):
+        return await get_sdk().tts.list_providers()
+
+def tts_provider_options(providers: List[Dict[str, Any]]) -> Dict[str, str]:
+    opts = {}
+    for p in providers:
+        if p.get('configured'):
+            provider_id = p.get('id')
+            name = p.get('name', provider_id)
+            ptype = p.get('type', 'unknown')
+            opts[provider_id] = f"[{ptype}] {name}"
+    return opts
+
+async def tts_speak(
+    text: str,
+    voice: Optional[str] = None,
+    speed: float = 1.0,
+    provider: Optional[str] = None,
+    language: Optional[str] = None,
+    num_inference_steps: Optional[int] = None
+) -> bytes:
+    async with limits.slot('tts'):
+        return await get_sdk().tts.speak(
+            text,
+            voice=voice,
+            speed=speed,
+            provider=provider,
+            language=language,
+            num_inference_steps=num_inference_steps
+        )
+
+async def tts_speak_stream(
+    text: str,
+    voice: Optional[str] = None,
+    speed: float = 1.0,
+    provider: Optional[str] = None,
+    language: Optional[str] = None,
+    num_inference_steps: Optional[int] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    async for chunk in limits.stream('tts', lambda: get_sdk().tts.speak_stream(
+        text,
+        voice=voice,
+        speed=speed,
+        provider=provider,
+        language=language,
+        num_inference_steps=num_inference_steps
+    )):
+        yield chunk
+
+def audio_data_url(audio_bytes: bytes, mime: str = 'audio/wav') -> str:
+    return f"data:{mime};base64,{base64.b64encode(audio_bytes).decode()}"
+
+async def audio_data_url_async(audio_bytes: bytes, mime: str = 'audio/wav') -> str:
+    """`audio_data_url`, encoded in a worker process for large buffers."""
+    return await offload.run('audio.base64', audio_data_url, audio_bytes, mime, size=len(audio_bytes))
+
+# --- STT ---
+
+async def list_stt_providers() -> List[Dict[str, Any]]:
+    async with limits.slot('api'):
+        res = await get_sdk().stt.list_providers()
+    return res.get('providers', [])
+
+async def stt_listen(
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    timeout_ms: Optional[int] = None
+) -> Dict[str, Any]:
+    options = {
+        "provider": provider,
+        "model": model
+    }
+    if timeout_ms:
+        options["timeout"] = timeout_ms
+    async with limits.slot('stt'):
+        return await get_sdk().stt.listen(options=options)
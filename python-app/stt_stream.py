@@ -0,0 +1,135 @@
+"""
+Continuous speech-to-text on top of the one-shot `sdk.stt.listen` call.
+
+The RealtimeX hub captures the microphone and returns one transcript per
+call, either when its VAD detects the end of an utterance or when the
+call's timeout elapses. Listening continuously therefore means issuing
+short, back-to-back segment calls:
+
+- every segment with speech extends the current utterance and is
+  reported as a partial transcript;
+- the utterance is final when a segment comes back silent, or when the
+  hub ended the segment early (its VAD saw the end of speech);
+- the next segment is requested immediately, so listening carries on
+  across utterances without a restart.
+
+A segment that ran into its timeout while the user was speaking may or
+may not be the end of the utterance. The next segment is then a short
+tail segment (`tail_ms`), so confirming the end by silence costs about
+`tail_ms` rather than a full segment. Speech in the tail extends the
+utterance as usual; if it also runs to the timeout, listening returns to
+full segments.
+
+The hub does not report when speech ended, so true end-of-speech latency
+cannot be measured through the SDK. Final events carry `finalize_ms`,
+the time from the hub returning the utterance's last text to the final
+event. That is 0 for VAD-ended segments and about one tail segment
+otherwise.
+
+Partial and final events carry `started`, when capture of the
+utterance's first segment began. Callers that play audio use it to
+recognise transcripts recorded while that audio was playing.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Optional, AsyncIterator
+
+import services
+
+# A segment returning this much earlier than its timeout was cut by the hub's VAD
+EARLY_RETURN_MARGIN = 0.25
+# Segment used to confirm the end of an utterance that hit the timeout
+TAIL_MS = 1200
+MAX_CONSECUTIVE_ERRORS = 3
+ERROR_BACKOFF = 1.0
+
+@dataclass
+class SttEvent:
+    kind: str  # 'partial', 'final' or 'error'
+    text: str
+    segment: int
+    # perf_counter() when the utterance's first segment (error: this segment) started capturing
+    started: float = 0.0
+    # Final events: last speech text returned -> final emitted (see module docstring)
+    finalize_ms: Optional[float] = None
+
+class ContinuousListener:
+    def __init__(
+        self,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        segment_ms: int = 4000,
+        tail_ms: int = TAIL_MS
+    ):
+        self.provider = provider
+        self.model = model
+        self.segment_ms = segment_ms
+        self.tail_ms = min(tail_ms, segment_ms)
+        self._stop = asyncio.Event()
+
+    def stop(self):
+        """Stop after the segment currently being captured."""
+        self._stop.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    async def events(self) -> AsyncIterator[SttEvent]:
+        utterance = []
+        utterance_started = 0.0
+        text_returned = 0.0
+        segment = 0
+        errors = 0
+        # After a speech segment that hit its timeout, listen briefly for more
+        tail = False
+
+        def finalize() -> SttEvent:
+            text = ' '.join(utterance)
+            utterance.clear()
+            return SttEvent('final', text, segment, utterance_started, finalize_ms=(time.perf_counter() - text_returned) * 1000)
+
+        while not self._stop.is_set():
+            segment += 1
+            timeout_ms = self.tail_ms if tail else self.segment_ms
+            started = time.perf_counter()
+            try:
+                res = await services.stt_listen(self.provider, self.model, timeout_ms=timeout_ms)
+            except Exception as e:
+                res = {'success': False, 'error': str(e)}
+            returned = time.perf_counter()
+            was_tail, tail = tail, False
+
+            if not res.get('success'):
+                errors += 1
+                if utterance:
+                    yield finalize()
+                if errors >= MAX_CONSECUTIVE_ERRORS:
+                    yield SttEvent('error', res.get('error', 'Unknown error'), segment, started)
+                    errors = 0
+                    await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            errors = 0
+
+            text = (res.get('text') or '').strip()
+            if not text:
+                # Silence closes the current utterance
+                if utterance:
+                    yield finalize()
+                continue
+
+            if not utterance:
+                utterance_started = started
+            utterance.append(text)
+            text_returned = returned
+            yield SttEvent('partial', ' '.join(utterance), segment, utterance_started)
+            if returned < started + timeout_ms / 1000 - EARLY_RETURN_MARGIN:
+                yield finalize()
+            else:
+                # Speech running through a tail means the user kept talking:
+                # go back to full segments rather than chopping it up
+                tail = not was_tail
+
+        if utterance:
+            yield finalize()
@@ -0,0 +1,62 @@
+from chat_sessions import ChatSession, fit_to_budget, merge_messages, estimate_tokens
+
+SYSTEM = {'role': 'system', 'content': 'You are helpful.'}
+
+def conversation(turns, size=400):
+    messages = [SYSTEM]
+    for i in range(turns):
+        messages.append({'role': 'user', 'content': f'question {i} ' + 'q' * size})
+        messages.append({'role': 'assistant', 'content': f'answer {i} ' + 'a' * size})
+    return messages
+
+def roles(messages):
+    return [m['role'] for m in messages]
+
+def test_fit_keeps_everything_within_budget():
+    session = ChatSession('s', 't', conversation(2))
+    pruned = fit_to_budget(session, budget=10_000, strategy='drop')
+    assert pruned.messages == session.messages
+    assert pruned.dropped == 0
+
+def test_fit_drops_whole_turns_and_starts_with_user():
+    # Enough for the newest turn and its follow-up question, but not the previous answer
+    messages = conversation(3) + [{'role': 'user', 'content': 'follow-up'}]
+    session = ChatSession('s', 't', messages)
+    pruned = fit_to_budget(session, budget=600, strategy='drop')
+    assert roles(pruned.messages)[:2] == ['system', 'user']
+    assert pruned.messages[-1]['content'] == 'follow-up'
+    assert pruned.dropped_messages == messages[1:1 + pruned.dropped]
+    assert pruned.dropped % 2 == 0
+
+def test_fit_keeps_newest_turn_over_budget():
+    session = ChatSession('s', 't', conversation(2, size=4000))
+    pruned = fit_to_budget(session, budget=100, strategy='drop')
+    assert roles(pruned.messages) == ['system', 'user', 'assistant']
+    assert pruned.messages[1]['content'].startswith('question 1')
+
+def test_fit_reserves_summary_only_when_dropping():
+    session = ChatSession('s', 't', conversation(2), summary='earlier stuff')
+    assert fit_to_budget(session, budget=10_000).messages == session.messages
+
+    pruned = fit_to_budget(ChatSession('s', 't', conversation(4), summary='earlier stuff'), budget=700)
+    assert pruned.dropped > 0
+    assert pruned.messages[1]['content'].startswith('Summary of earlier conversation')
+    assert pruned.messages[2]['role'] == 'user'
+    assert pruned.sent_tokens <= 700
+
+def test_fit_skips_leading_assistant_message():
+    messages = [SYSTEM, {'role': 'assistant', 'content': 'Hi, how can I help?'}] + conversation(1)[1:]
+    pruned = fit_to_budget(ChatSession('s', 't', messages), budget=estimate_tokens(SYSTEM['content']) + 250, strategy='drop')
+    assert roles(pruned.messages) == ['system', 'user', 'assistant']
+
+def test_merge_appends_without_system():
+    history = conversation(1)
+    new = [{'role': 'user', 'content': 'next'}]
+    assert merge_messages(history, new) == history + new
+
+def test_merge_replaces_system_prompt():
+    history = conversation(1)
+    new_system = {'role': 'system', 'content': 'Be brief.'}
+    new = [new_system, {'role': 'user', 'content': 'next'}]
+    merged = merge_messages(history, new)
+    assert merged == [new_system] + history[1:] + [new[1]]
@@ -0,0 +1,247 @@
+"""
+Pipelined voice assistant: continuous STT -> streaming chat -> streaming TTS.
+
+Instead of waiting for the full completion before synthesis, the chat
+stream is cut into sentences and each complete sentence is sent to TTS
+while later tokens are still arriving. Sentences are synthesized in
+order by a single TTS worker so audio plays back in sequence.
+
+If the user starts speaking while a reply is in progress (a partial
+transcript arrives), the reply is cancelled and any queued audio is
+dropped (barge-in). The microphone keeps capturing during playback, so
+with speakers the assistant would hear, and interrupt, itself. Barge-in
+therefore needs headphones. With `allow_barge_in=False` the reply counts
+as playing from its first audio chunk until the player reports that the
+last clip ended (`playback_idle`), and transcripts of segments that
+started capturing before then are ignored. A segment can return well
+after playback ended and still carry the reply's words, so it is judged
+by when it started, not when it returned.
+
+Each turn is timed from the moment the final transcript is available to
+the first token, first sentence and first audio chunk. The hub does not
+report when speech ended, so STT time is shown separately as the wait
+for the end of the utterance to be confirmed (see `stt_stream`).
+"""
+import asyncio
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Iterator
+
+import services
+import stt_stream
+
+VOICE_SYSTEM_PROMPT = (
+    "You are a voice assistant. Answer conversationally in short sentences "
+    "without markdown, lists or code blocks."
+)
+
+# Sentence end: terminal punctuation followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r'(?<=[.!?;:])\s+|\n+')
+# Very short fragments ("Hi." / "1.") are merged with the next sentence
+MIN_SENTENCE_CHARS = 12
+
+class SentenceSplitter:
+    """Accumulate streamed text and release complete sentences."""
+
+    def __init__(self, min_chars: int = MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self._buffer = ''
+
+    def feed(self, text: str) -> Iterator[str]:
+        self._buffer += text
+        start = 0
+        for match in _SENTENCE_END.finditer(self._buffer):
+            sentence = self._buffer[start:match.start()].strip()
+            if len(sentence) >= self.min_chars:
+                yield sentence
+                start = match.end()
+        self._buffer = self._buffer[start:]
+
+    def flush(self) -> Iterator[str]:
+        rest = self._buffer.strip()
+        self._buffer = ''
+        if rest:
+            yield rest
+
+@dataclass
+class VoiceTurnTimings:
+    # perf_counter() when the final transcript arrived
+    text_at: float
+    finalize_ms: float = 0.0
+    first_token_ms: Optional[float] = None
+    first_sentence_ms: Optional[float] = None
+    first_audio_ms: Optional[float] = None
+    sentences: int = 0
+    interrupted: bool = False
+    error: Optional[str] = None
+
+    def since_text(self) -> float:
+        return (time.perf_counter() - self.text_at) * 1000
+
+    def summary(self) -> str:
+        def ms(v):
+            return f"{v:.0f}ms" if v is not None else "-"
+        return (f"end-of-utterance wait {ms(self.finalize_ms)} | text → first token {ms(self.first_token_ms)} | "
+                f"first sentence {ms(self.first_sentence_ms)} | first audio {ms(self.first_audio_ms)}")
+
+class VoicePipeline:
+    def __init__(
+        self,
+        listener: stt_stream.ContinuousListener,
+        tts_options: Dict[str, Any],
+        chat_provider: Optional[str] = None,
+        chat_model: Optional[str] = None,
+        on_partial: Optional[Callable[[str], None]] = None,
+        on_transcript: Optional[Callable[[str], None]] = None,
+        on_text: Optional[Callable[[str], None]] = None,
+        on_audio: Optional[Callable[[bytes, str], Awaitable[None]]] = None,
+        on_barge_in: Optional[Callable[[], Awaitable[None]]] = None,
+        on_turn_done: Optional[Callable[[VoiceTurnTimings], None]] = None,
+        allow_barge_in: bool = True,
+        is_playing: Optional[Callable[[], Awaitable[bool]]] = None
+    ):
+        self.listener = listener
+        self.tts_options = tts_options
+        self.chat_provider = chat_provider
+        self.chat_model = chat_model
+        self.on_partial = on_partial
+        self.on_transcript = on_transcript
+        self.on_text = on_text
+        self.on_audio = on_audio
+        self.on_barge_in = on_barge_in
+        self.on_turn_done = on_turn_done
+        self.allow_barge_in = allow_barge_in
+        self.is_playing = is_playing
+        self.history: List[Dict[str, Any]] = [{'role': 'system', 'content': VOICE_SYSTEM_PROMPT}]
+        self._turn: Optional[asyncio.Task] = None
+        # perf_counter() when our audio last stopped playing; inf while it plays
+        self._playback_until = 0.0
+        # The current turn may still queue audio
+        self._audio_pending = False
+
+    def stop(self):
+        self.listener.stop()
+
+    async def run(self):
+        """Listen until stopped, answering each final utterance."""
+        try:
+            async for event in self.listener.events():
+                if event.kind in ('partial', 'final') and self._heard_playback(event):
+                    continue
+                if event.kind == 'partial':
+                    await self._barge_in()
+                    if self.on_partial:
+                        self.on_partial(event.text)
+                elif event.kind == 'final':
+                    await self._barge_in()
+                    if self.on_transcript:
+                        self.on_transcript(event.text)
+                    timings = VoiceTurnTimings(text_at=time.perf_counter(), finalize_ms=event.finalize_ms)
+                    self._turn = asyncio.ensure_future(self._respond(event.text, timings))
+        finally:
+            await self._barge_in()
+
+    def _heard_playback(self, event: stt_stream.SttEvent) -> bool:
+        """Without barge-in, speech captured during playback is our own reply."""
+        return not self.allow_barge_in and event.started < self._playback_until
+
+    def playback_idle(self):
+        """The player finished its last queued clip.
+
+        Between sentences the player runs dry while the next one is still
+        being synthesized, so this only ends playback once the turn has
+        queued all of its audio.
+        """
+        if not self._audio_pending and self._playback_until == math.inf:
+            self._playback_until = time.perf_counter()
+
+    async def _audio_done(self):
+        """The turn queued all of its audio; end playback now if the player is already idle."""
+        self._audio_pending = False
+        if self._playback_until != math.inf:
+            return
+        playing = False
+        if self.is_playing is not None:
+            try:
+                playing = await self.is_playing()
+            except Exception:
+                pass
+        if not playing:
+            self._playback_until = time.perf_counter()
+
+    async def _barge_in(self):
+        """Cancel the reply in progress and drop its queued audio.
+
+        Audio may still be playing after the turn itself has finished, so
+        playback is cleared whenever there was a previous turn.
+        """
+        if self._turn is None:
+            return
+        if not self._turn.done():
+            self._turn.cancel()
+            try:
+                await self._turn
+            except asyncio.CancelledError:
+                pass
+        self._turn = None
+        if self.on_barge_in:
+            await self.on_barge_in()
+        self._audio_pending = False
+        if self._playback_until == math.inf:
+            self._playback_until = time.perf_counter()
+
+    async def _respond(self, text: str, timings: VoiceTurnTimings):
+        self.history.append({'role': 'user', 'content': text})
+        sentences: asyncio.Queue = asyncio.Queue()
+        speaker = asyncio.ensure_future(self._speak(sentences, timings))
+        self._audio_pending = True
+        reply = ''
+        try:
+            splitter = SentenceSplitter()
+            async for delta in services.chat_stream(self.history, provider=self.chat_provider, model=self.chat_model):
+                if timings.first_token_ms is None:
+                    timings.first_token_ms = timings.since_text()
+                reply += delta
+                if self.on_text:
+                    self.on_text(delta)
+                for sentence in splitter.feed(delta):
+                    if timings.first_sentence_ms is None:
+                        timings.first_sentence_ms = timings.since_text()
+                    sentences.put_nowait(sentence)
+            for sentence in splitter.flush():
+                sentences.put_nowait(sentence)
+            sentences.put_nowait(None)
+            await speaker
+            await self._audio_done()
+        except asyncio.CancelledError:
+            timings.interrupted = True
+            speaker.cancel()
+            raise
+        except Exception as e:
+            speaker.cancel()
+            timings.error = services.describe_error(e)
+            await self._audio_done()
+        finally:
+            if reply:
+                self.history.append({'role': 'assistant', 'content': reply})
+            if self.on_turn_done:
+                self.on_turn_done(timings)
+
+    async def _speak(self, sentences: asyncio.Queue, timings: VoiceTurnTimings):
+        """Synthesize queued sentences in order, forwarding audio as it streams in."""
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                return
+            timings.sentences += 1
+            async for chunk in services.tts_speak_stream(sentence, **self.tts_options):
+                audio = chunk.get('audio', b'')
+                if not audio:
+                    continue
+                if timings.first_audio_ms is None:
+                    timings.first_audio_ms = timings.since_text()
+                self._playback_until = math.inf
+                if self.on_audio:
+                    await self.on_audio(audio, chunk.get('mimeType', 'audio/wav'))
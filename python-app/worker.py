@@ -0,0 +1,417 @@
+"""
+Headless worker / CLI for the RealtimeX demo.
+
+Runs the same actions as the NiceGUI dashboard without importing NiceGUI,
+so it can be used for batch jobs and background task processing on servers
+with no browser.
+
+Examples:
+    python worker.py status
+    python worker.py chat "Summarize RealtimeX in one line" --model openai/gpt-4o-mini
+    python worker.py batch jobs.jsonl > results.jsonl
+    python worker.py process --interval 10
+    python worker.py startup-bench
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Dict, Any, Optional, Tuple
+
+import services
+import rag
+import stt_stream
+
+def log(msg: str):
+    print(msg, file=sys.stderr, flush=True)
+
+def emit(data: Any):
+    print(json.dumps(data, default=str), flush=True)
+
+# --- Commands ---
+
+async def cmd_status(args):
+    emit(await services.system_status())
+
+async def cmd_activities(args):
+    emit(await services.list_activities(limit=args.limit, status=args.status))
+
+def _chat_messages(args) -> List[Dict[str, Any]]:
+    if args.messages:
+        return json.loads(args.messages)
+    return [{"role": "user", "content": args.prompt}]
+
+async def cmd_chat(args):
+    provider, model = services.split_model(args.model)
+    response_format = {"type": "json_object"} if args.json else None
+    messages = _chat_messages(args)
+    cache = True if args.cache else None
+    options = {'provider': provider, 'model': model, 'response_format': response_format, 'cache': cache}
+    chat_fn, chat_stream_fn = services.chat, services.chat_stream
+    if args.session:
+        session_id = services.create_session().id if args.session == 'new' else args.session
+        log(f"Session {session_id}")
+        options.update(budget=args.budget, on_context=lambda ctx: log(
+            f"Context: {ctx.sent_tokens}/{ctx.full_tokens} tokens sent, {ctx.saved_tokens} saved ({ctx.dropped} pruned)"))
+        chat_fn = lambda m, **kw: services.session_chat(session_id, m, **kw)
+        chat_stream_fn = lambda m, **kw: services.session_chat_stream(session_id, m, **kw)
+    if args.stream:
+        async for text in chat_stream_fn(messages, **options):
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        sys.stdout.write("\n")
+    else:
+        print(await chat_fn(messages, **options))
+
+async def cmd_sessions(args):
+    emit(services.list_sessions())
+
+async def cmd_embed(args):
+    provider, model = services.split_model(args.model)
+    res = await services.embed(args.text, provider=provider, model=model)
+    emit({'dimensions': res.get('dimensions'), 'embedding': res.get('embeddings', [[]])[0]})
+
+async def cmd_ingest(args):
+    provider, model = services.split_model(args.model)
+    with open(args.file, encoding='utf-8') as f:
+        texts = [t.strip() for t in f if t.strip()]
+    log(f"Embedding and storing {len(texts)} texts...")
+    res = await services.embed_and_store(
+        texts,
+        document_id=args.document_id,
+        workspace_id=args.workspace_id,
+        provider=provider,
+        model=model
+    )
+    for error in res['errors']:
+        log(f"Store batch failed: {error}")
+    emit(res)
+    if res['failed']:
+        sys.exit(1)
+
+async def cmd_search(args):
+    provider, model = services.split_model(args.model)
+    if len(args.query) == 1:
+        emit(await services.search(
+            args.query[0],
+            top_k=args.top_k,
+            workspace_id=args.workspace_id,
+            document_id=args.document_id,
+            provider=provider,
+            model=model
+        ))
+        return
+    # Many queries: embed them in tuned batches, then search concurrently
+    vectors = await services.embed_many(args.query, provider=provider, model=model)
+    results = await asyncio.gather(*(services.vector_query(
+        vec,
+        top_k=args.top_k,
+        workspace_id=args.workspace_id,
+        document_id=args.document_id,
+        model=model
+    ) for vec in vectors))
+    for query, matches in zip(args.query, results):
+        emit({'query': query, 'results': matches})
+
+async def cmd_tune_embed(args):
+    provider, model = services.split_model(args.model)
+    samples = None
+    if args.samples:
+        with open(args.samples, encoding='utf-8') as f:
+            samples = [t.strip() for t in f if t.strip()]
+
+    def on_probe(probe):
+        result = probe.error or f"{probe.chunks_per_sec:.1f} chunks/s"
+        log(f"batch {probe.batch_size:>3} x {probe.concurrency}: {result}")
+
+    settings = await services.autotune_embeddings(provider, model, sample_texts=samples, on_probe=on_probe)
+    emit(settings.__dict__ if settings else {'error': 'every probe failed'})
+
+async def cmd_rag(args):
+    embed_provider, embed_model = services.split_model(args.embed_model)
+    chat_provider, chat_model = services.split_model(args.model)
+    timings = rag.RagTimings()
+    async for text in rag.answer_stream(
+        args.question,
+        rag.EmbeddingPrefetcher(),
+        timings,
+        top_k=args.top_k,
+        workspace_id=args.workspace_id,
+        document_id=args.document_id,
+        embed_provider=embed_provider,
+        embed_model=embed_model,
+        chat_provider=chat_provider,
+        chat_model=chat_model,
+        on_matches=lambda matches: log(f"Retrieved {len(matches)} matches")
+    ):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    sys.stdout.write("\n")
+    log(timings.summary())
+
+async def cmd_listen(args):
+    if not args.continuous:
+        emit(await services.stt_listen(args.provider, args.model))
+        return
+    listener = stt_stream.ContinuousListener(args.provider, args.model, segment_ms=args.segment_ms)
+    log("Listening continuously (Ctrl-C to stop)...")
+    async for event in listener.events():
+        if event.kind == 'partial':
+            log(f"… {event.text}")
+        elif event.kind == 'final':
+            emit({'text': event.text, 'finalize_ms': round(event.finalize_ms, 1)})
+        else:
+            log(f"STT Error: {event.text}")
+
+async def run_job(job: Dict[str, Any], default_model: Optional[str], cache: Optional[bool] = None) -> Dict[str, Any]:
+    """Run one batch job: {"messages": [...]} or {"prompt": "..."}, optional "model" / "json"."""
+    provider, model = services.split_model(job.get('model') or default_model)
+    messages = job.get('messages') or [{"role": "user", "content": job.get('prompt', '')}]
+    response_format = {"type": "json_object"} if job.get('json') else None
+    content = await services.chat(messages, provider=provider, model=model, response_format=response_format, cache=cache)
+    return {'id': job.get('id'), 'content': content}
+
+async def cmd_batch(args):
+    with open(args.file, encoding='utf-8') as f:
+        jobs = [json.loads(line) for line in f if line.strip()]
+    log(f"Running {len(jobs)} jobs (concurrency {args.concurrency})...")
+    sem = asyncio.Semaphore(args.concurrency)
+
+    async def guarded(job):
+        async with sem:
+            try:
+                return await run_job(job, args.model, cache=True if args.cache else None)
+            except Exception as e:
+                return {'id': job.get('id'), 'error': services.describe_error(e)}
+
+    for result in await asyncio.gather(*(guarded(job) for job in jobs)):
+        emit(result)
+    if args.cache:
+        log(f"Chat cache: {services.chat_cache.get_cache().stats()}")
+    log(f"Capacity: {json.dumps(services.capacity_stats()['llm.chat'])}")
+
+async def cmd_cache(args):
+    cache = services.chat_cache.get_cache()
+    if args.action == 'clear':
+        cache.clear()
+    emit(cache.stats())
+
+async def process_activity(activity: Dict[str, Any], args):
+    """Answer one pending activity with the chat model and mark it completed."""
+    activity_id = activity['id']
+    try:
+        await services.update_activity(activity_id, 'processing')
+    except Exception as e:
+        # Still pending, so the next poll retries it
+        log(f"Could not claim {activity_id[:8]}: {services.describe_error(e)}")
+        return
+    try:
+        provider, model = services.split_model(args.model)
+        content = await services.chat([
+            {"role": "system", "content": args.prompt},
+            {"role": "user", "content": json.dumps(activity.get('raw_data', {}))}
+        ], provider=provider, model=model)
+        await services.update_activity(activity_id, 'completed')
+        log(f"Completed {activity_id[:8]}")
+        emit({'id': activity_id, 'content': content})
+    except Exception as e:
+        log(f"Failed {activity_id[:8]}: {services.describe_error(e)}")
+        try:
+            await services.update_activity(activity_id, 'failed')
+        except Exception as update_error:
+            log(f"Could not mark {activity_id[:8]} failed: {services.describe_error(update_error)}")
+
+async def cmd_process(args):
+    while True:
+        try:
+            pending = await services.list_activities(limit=args.limit, status='pending')
+        except Exception as e:
+            # Transient hub errors must not stop a long-running worker
+            log(f"Poll failed: {services.describe_error(e)}")
+            pending = []
+        if pending:
+            log(f"Processing {len(pending)} pending activities...")
+        for activity in pending:
+            try:
+                await process_activity(activity, args)
+            except Exception as e:
+                log(f"Error processing {str(activity.get('id'))[:8]}: {services.describe_error(e)}")
+        # Finish this poll's cache embeddings before idling, so stopping the worker between polls loses nothing
+        await services.drain_background_tasks()
+        if args.once:
+            return
+        await asyncio.sleep(args.interval)
+
+async def cmd_task(args):
+    if args.action == 'start':
+        await services.start_task(args.uuid)
+    elif args.action == 'complete':
+        await services.complete_task(args.uuid, result={"message": args.message or "Task processed by headless worker"})
+    else:
+        await services.fail_task(args.uuid, error=args.message or "Task failed in headless worker")
+    emit(await services.get_task(args.uuid))
+
+# --- Startup Benchmark ---
+
+STARTUP_PROBES = {
+    # Headless: service layer plus SDK construction, no UI toolkit
+    'headless': "import services; services.get_sdk()",
+    # Dashboard: importing main pulls in NiceGUI and builds the page
+    'ui': "import main",
+}
+
+def measure_import(code: str) -> Tuple[float, bool]:
+    probe = (
+        "import time, sys; t = time.perf_counter(); "
+        f"{code}; "
+        "print(time.perf_counter() - t, 'nicegui' in sys.modules)"
+    )
+    out = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    seconds, nicegui_loaded = out.stdout.split()
+    return float(seconds), nicegui_loaded == 'True'
+
+def cmd_startup_bench(args):
+    """Time a cold import of the headless path vs. the NiceGUI dashboard."""
+    results = {}
+    for name, code in STARTUP_PROBES.items():
+        try:
+            runs = [measure_import(code) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as e:
+            results[name] = {'error': e.stderr.strip().splitlines()[-1]}
+            continue
+        results[name] = {
+            'median_ms': round(statistics.median(r[0] for r in runs) * 1000, 1),
+            'nicegui_loaded': runs[0][1],
+        }
+    emit(results)
+
+# --- Entry Point ---
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Headless RealtimeX demo worker")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('status', help='Ping RealtimeX and show the app data dir')
+
+    p = sub.add_parser('activities', help='List activities')
+    p.add_argument('--limit', type=int, default=20)
+    p.add_argument('--status')
+
+    p = sub.add_parser('chat', help='Send a chat completion')
+    p.add_argument('prompt', nargs='?', default='Hello!')
+    p.add_argument('--messages', help='Messages JSON (overrides prompt)')
+    p.add_argument('--model', help='provider/model')
+    p.add_argument('--json', action='store_true', help='JSON mode')
+    p.add_argument('--stream', action='store_true')
+    p.add_argument('--cache', action='store_true', help='Use the chat response cache')
+    p.add_argument('--session', help="Chat session id, or 'new'")
+    p.add_argument('--budget', type=int, help='Prompt token budget for session context')
+
+    sub.add_parser('sessions', help='List chat sessions')
+
+    p = sub.add_parser('embed', help='Generate an embedding')
+    p.add_argument('text')
+    p.add_argument('--model', help='provider/model')
+
+    p = sub.add_parser('ingest', help='Embed and store a file (one text per line)')
+    p.add_argument('file')
+    p.add_argument('--workspace-id')
+    p.add_argument('--document-id')
+    p.add_argument('--model', help='provider/model')
+
+    p = sub.add_parser('search', help='Semantic search (several queries are embedded in batches)')
+    p.add_argument('query', nargs='+')
+    p.add_argument('--top-k', type=int, default=3)
+    p.add_argument('--workspace-id')
+    p.add_argument('--document-id')
+    p.add_argument('--model', help='provider/model')
+
+    p = sub.add_parser('tune-embed', help='Autotune embedding batch size / concurrency for a model')
+    p.add_argument('--model', help='provider/model')
+    p.add_argument('--samples', help='File with sample texts (one per line)')
+
+    p = sub.add_parser('rag', help='Answer a question from the vector store (streaming)')
+    p.add_argument('question')
+    p.add_argument('--top-k', type=int, default=3)
+    p.add_argument('--workspace-id')
+    p.add_argument('--document-id')
+    p.add_argument('--embed-model', help='provider/model for the query embedding')
+    p.add_argument('--model', help='provider/model for the answer')
+
+    p = sub.add_parser('listen', help='Speech-to-text (one utterance, or continuous)')
+    p.add_argument('--provider')
+    p.add_argument('--model')
+    p.add_argument('--continuous', action='store_true')
+    p.add_argument('--segment-ms', type=int, default=4000)
+
+    p = sub.add_parser('batch', help='Run chat jobs from a JSONL file')
+    p.add_argument('file')
+    p.add_argument('--model', help='Default provider/model')
+    p.add_argument('--concurrency', type=int, default=4)
+    p.add_argument('--cache', action='store_true', help='Use the chat response cache')
+
+    p = sub.add_parser('process', help='Answer pending activities with the chat model')
+    p.add_argument('--prompt', default='Please process this activity.')
+    p.add_argument('--model', help='provider/model')
+    p.add_argument('--limit', type=int, default=20)
+    p.add_argument('--interval', type=float, default=10.0)
+    p.add_argument('--once', action='store_true')
+
+    p = sub.add_parser('task', help='Report task status')
+    p.add_argument('action', choices=['start', 'complete', 'fail'])
+    p.add_argument('uuid')
+    p.add_argument('--message')
+
+    p = sub.add_parser('cache', help='Show or clear the chat response cache')
+    p.add_argument('action', choices=['stats', 'clear'])
+
+    p = sub.add_parser('startup-bench', help='Compare headless vs UI import time')
+    p.add_argument('--runs', type=int, default=5)
+
+    return parser
+
+COMMANDS = {
+    'status': cmd_status,
+    'activities': cmd_activities,
+    'chat': cmd_chat,
+    'sessions': cmd_sessions,
+    'embed': cmd_embed,
+    'ingest': cmd_ingest,
+    'search': cmd_search,
+    'rag': cmd_rag,
+    'tune-embed': cmd_tune_embed,
+    'listen': cmd_listen,
+    'batch': cmd_batch,
+    'process': cmd_process,
+    'task': cmd_task,
+    'cache': cmd_cache,
+}
+
+async def run_command(args):
+    try:
+        await COMMANDS[args.command](args)
+    finally:
+        # Summary refreshes and cache prompt embeddings run in the background;
+        # asyncio.run would cancel them on exit
+        await services.drain_background_tasks()
+        await services.limits.close_http_pool()
+
+def main(argv: Optional[List[str]] = None):
+    args = build_parser().parse_args(argv)
+    if args.command == 'startup-bench':
+        cmd_startup_bench(args)
+        return
+    try:
+        asyncio.run(run_command(args))
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        log(services.describe_error(e))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()